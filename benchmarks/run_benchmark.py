@@ -0,0 +1,327 @@
+"""Benchmark e teste de carga das funções de acesso a dados do pacote sgpgf.
+
+Popula um PostgreSQL local com dados sintéticos (usuários e anos de
+weight_records), mede cada função de leitura com e sem cache e simula N
+sessões simultâneas recarregando os dashboards de funcionário e admin. O
+resultado sai em JSON para acompanhar regressões ao longo do tempo.
+
+Uso:
+    python benchmarks/run_benchmark.py --database-url postgresql://... \\
+        --users 100 --years 2 --sessions 20 --output bench.json
+
+Sem --database-url, um cluster temporário é criado com initdb/pg_ctl (os
+binários do PostgreSQL precisam estar no PATH ou em ``pg_config --bindir``).
+O banco informado é APAGADO e recriado; nunca aponte para produção.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_NAMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabriela", "Hugo",
+               "Iara", "João", "Karina", "Lucas", "Marta", "Nelson", "Olívia", "Paulo"]
+LAST_NAMES = ["Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Costa",
+              "Almeida", "Ferreira", "Rodrigues", "Gomes", "Martins"]
+
+class TemporaryPostgres:
+    """Cluster PostgreSQL descartável em um diretório temporário."""
+
+    def __init__(self):
+        self.bindir = self._find_bindir()
+        self.datadir = tempfile.mkdtemp(prefix="sgpgf-bench-")
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            self.port = probe.getsockname()[1]
+
+    @staticmethod
+    def _find_bindir():
+        initdb = shutil.which("initdb")
+        if initdb:
+            return os.path.dirname(initdb)
+        try:
+            return subprocess.check_output(["pg_config", "--bindir"], text=True).strip()
+        except (OSError, subprocess.CalledProcessError):
+            raise SystemExit("initdb não encontrado: informe --database-url")
+
+    def start(self):
+        subprocess.run([os.path.join(self.bindir, "initdb"), "-D", self.datadir, "-U", "bench",
+                        "--auth=trust", "-E", "UTF8"], check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([os.path.join(self.bindir, "pg_ctl"), "-D", self.datadir, "-w",
+                        "-l", os.path.join(self.datadir, "server.log"),
+                        "-o", f"-p {self.port} -k {self.datadir} -c listen_addresses=''",
+                        "start"], check=True, stdout=subprocess.DEVNULL)
+        return f"postgresql://bench@/postgres?host={self.datadir}&port={self.port}"
+
+    def stop(self):
+        subprocess.run([os.path.join(self.bindir, "pg_ctl"), "-D", self.datadir, "-m", "fast",
+                        "stop"], stdout=subprocess.DEVNULL)
+        shutil.rmtree(self.datadir, ignore_errors=True)
+
+def recreate_database(admin_url, name):
+    import psycopg2
+
+    conn = psycopg2.connect(admin_url)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute(f'DROP DATABASE IF EXISTS "{name}"')
+    cursor.execute(f'CREATE DATABASE "{name}"')
+    cursor.close()
+    conn.close()
+
+def database_url_for(admin_url, name):
+    from psycopg2.extensions import make_dsn
+
+    return make_dsn(admin_url, dbname=name)
+
+def seed(conn, app, users, years, records_per_day, rng):
+    """Cria o esquema via migrações do app e carrega os dados com COPY."""
+    app.schema.apply_schema_migrations(conn)
+    start = date.today() - timedelta(days=365 * years)
+    # Partições mensais para todo o período gerado, como em produção
+    app.partitions.ensure_partitions(conn, start)
+    cursor = conn.cursor()
+
+    buffer = io.StringIO()
+    for index in range(users):
+        work_type = app.config.WORK_TYPES[index % len(app.config.WORK_TYPES)]
+        buffer.write(f"{index + 1:011d},{rng.choice(FIRST_NAMES)},{rng.choice(LAST_NAMES)},"
+                     f"{work_type},{'t' if index == 0 else 'f'}\n")
+    buffer.seek(0)
+    cursor.copy_expert("COPY users (cpf, first_name, last_name, work_type, is_admin) "
+                       "FROM STDIN WITH (FORMAT csv)", buffer)
+    cursor.execute("SELECT id, work_type FROM users WHERE NOT is_admin")
+    employees = cursor.fetchall()
+
+    total = 0
+    day = start
+    while day <= date.today():
+        # Um dia por COPY mantém a memória do gerador limitada
+        if day.weekday() < 6:
+            buffer = io.StringIO()
+            for user_id, work_type in employees:
+                for _ in range(rng.randint(0, records_per_day * 2)):
+                    buffer.write(f"{user_id},{rng.uniform(5, 80):.2f},{work_type},,{day.isoformat()}\n")
+                    total += 1
+            buffer.seek(0)
+            cursor.copy_expert("COPY weight_records (user_id, weight, work_type, notes, record_date) "
+                               "FROM STDIN WITH (FORMAT csv)", buffer)
+        day += timedelta(days=1)
+    conn.commit()
+
+    refresh_derived_tables(cursor, app)
+    conn.commit()
+    cursor.execute("ANALYZE")
+    conn.commit()
+    cursor.close()
+    return total
+
+def refresh_derived_tables(cursor, app):
+    # O COPY não passa pelas rotinas de escrita do app: recalcula os agregados
+    cursor.execute("TRUNCATE weight_daily_rollup")
+    cursor.execute("""
+        INSERT INTO weight_daily_rollup (record_date, user_id, work_type, total_weight, record_count)
+        SELECT record_date, user_id, work_type, SUM(weight), COUNT(*)
+        FROM weight_records WHERE user_id IS NOT NULL
+        GROUP BY record_date, user_id, work_type
+    """)
+    cursor.execute("SELECT id FROM users")
+    app.repository.refresh_user_summaries(cursor, [row[0] for row in cursor.fetchall()])
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+
+def benchmark_functions(app, cases, iterations):
+    results = {}
+    for name, func, args in cases:
+        uncached = getattr(func, '__wrapped__', func)
+        cold, warm = [], []
+        tracemalloc.start()
+        for _ in range(iterations):
+            started = time.perf_counter()
+            uncached(*args)
+            cold.append(time.perf_counter() - started)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        for _ in range(iterations):
+            started = time.perf_counter()
+            func(*args)
+            warm.append(time.perf_counter() - started)
+        results[name] = {'uncached': summarize(cold), 'cached': summarize(warm),
+                         'peak_alloc_kb': peak / 1024}
+    return results
+
+def employee_rerun(app, user_id, use_cache):
+    call = (lambda f: f) if use_cache else (lambda f: getattr(f, '__wrapped__', f))
+    call(app.repository.get_weight_summary)(user_id)
+    call(app.repository.get_weight_records_page)(user_id, None, None, None)
+
+def admin_rerun(app, use_cache):
+    call = (lambda f: f) if use_cache else (lambda f: getattr(f, '__wrapped__', f))
+    call(app.repository.get_daily_stats)()
+    if use_cache:
+        app.directory.get_user_directory().user_options()
+    else:
+        app.repository.get_directory_users()
+    call(app.repository.get_weight_records_page)(None, date.today() - timedelta(days=30),
+                                                 date.today(), None)
+    call(app.repository.get_report_rollups)(date.today() - timedelta(days=app.config.REPORT_DAYS - 1))
+    call(app.repository.get_weight_series)(None, date.today() - timedelta(days=app.config.REPORT_DAYS - 1),
+                                           "day", True)
+
+def simulate_sessions(app, employee_ids, sessions, reruns, use_cache, rng):
+    """Cada sessão alterna entre recarregar o dashboard de funcionário e o de admin."""
+    timings = {'employee': [], 'admin': []}
+    lock = threading.Lock()
+
+    def session(index):
+        session_rng = random.Random(rng.random() + index)
+        for rerun in range(reruns):
+            kind = 'admin' if index % 10 == 0 else 'employee'
+            started = time.perf_counter()
+            if kind == 'admin':
+                admin_rerun(app, use_cache)
+            else:
+                employee_rerun(app, session_rng.choice(employee_ids), use_cache)
+            with lock:
+                timings[kind].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        list(executor.map(session, range(sessions)))
+    wall = time.perf_counter() - started
+
+    total = sum(len(v) for v in timings.values())
+    return {
+        'sessions': sessions,
+        'reruns_per_session': reruns,
+        'wall_s': wall,
+        'reruns_per_s': total / wall if wall else 0,
+        'employee_rerun': summarize(timings['employee']) if timings['employee'] else None,
+        'admin_rerun': summarize(timings['admin']) if timings['admin'] else None,
+    }
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "-C", ROOT, "rev-parse", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="URL de um servidor PostgreSQL (o banco --database é recriado)")
+    parser.add_argument("--database", default="sgpgf_bench")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--records-per-day", type=int, default=2,
+                        help="média de pesagens por funcionário em cada dia útil")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="-", help="arquivo JSON de saída (- para stdout)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    server = None
+    admin_url = args.database_url
+    if not admin_url:
+        server = TemporaryPostgres()
+        admin_url = server.start()
+
+    try:
+        recreate_database(admin_url, args.database)
+        os.environ["DATABASE_URL"] = database_url_for(admin_url, args.database)
+        os.environ.setdefault("DB_POOL_MAX", str(max(args.sessions, 10)))
+
+        sys.path.insert(0, ROOT)
+        import_started = time.perf_counter()
+        import sgpgf.directory
+        import sgpgf.repository
+        import sgpgf.schema
+        app = sgpgf
+        import_s = time.perf_counter() - import_started
+
+        import psycopg2
+        conn = psycopg2.connect(os.environ["DATABASE_URL"])
+        seed_started = time.perf_counter()
+        rows = seed(conn, app, args.users, args.years, args.records_per_day, rng)
+        seed_s = time.perf_counter() - seed_started
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM users WHERE NOT is_admin ORDER BY id")
+        employee_ids = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        conn.close()
+
+        user_id = employee_ids[len(employee_ids) // 2]
+        month_ago = date.today() - timedelta(days=30)
+        cases = [
+            ("get_weight_summary", app.repository.get_weight_summary, (user_id,)),
+            ("get_daily_stats", app.repository.get_daily_stats, ()),
+            ("get_all_users", app.repository.get_all_users, ()),
+            ("get_weight_records_page", app.repository.get_weight_records_page,
+             (None, month_ago, date.today(), None)),
+            ("get_weight_history", app.repository.get_weight_history, (user_id,)),
+            ("get_weight_series[user,week]", app.repository.get_weight_series, (user_id, None, "week")),
+            ("get_weight_series[all,day]", app.repository.get_weight_series, (None, None, "day", True)),
+            ("get_report_rollups", app.repository.get_report_rollups,
+             (date.today() - timedelta(days=app.config.REPORT_DAYS - 1),)),
+        ]
+
+        result = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'users': args.users,
+                'years': args.years,
+                'weight_records': rows,
+                'seed_s': seed_s,
+                'import_s': import_s,
+            },
+            'functions': benchmark_functions(app, cases, args.iterations),
+            'sessions': {
+                'uncached': simulate_sessions(app, employee_ids, args.sessions, args.reruns, False, rng),
+                'cached': simulate_sessions(app, employee_ids, args.sessions, args.reruns, True, rng),
+            },
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'query_metrics': app.metrics.get_query_metrics().snapshot()['functions'],
+        }
+        app.db.close_db_pool()
+    finally:
+        if server:
+            server.stop()
+
+    output = json.dumps(result, indent=2, default=str)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w") as fileobj:
+            fileobj.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/bin/bash
+# Inicia WORKERS processos Streamlit (padrão: um por núcleo) em portas
+# consecutivas a partir de BASE_PORT, para ficarem atrás do nginx
+# (deploy/nginx.conf). As conexões do banco são divididas entre os workers
+# e o cache de consultas é compartilhado (CACHE_BACKEND).
+
+set -euo pipefail
+
+WORKERS="${WORKERS:-$(nproc)}"
+BASE_PORT="${BASE_PORT:-8501}"
+
+# Total de conexões PostgreSQL que o app inteiro pode abrir
+DB_POOL_TOTAL="${DB_POOL_TOTAL:-40}"
+if [ -z "${DB_POOL_MAX:-}" ]; then
+  DB_POOL_MAX=$(( DB_POOL_TOTAL / WORKERS ))
+  [ "$DB_POOL_MAX" -lt 2 ] && DB_POOL_MAX=2
+fi
+export DB_POOL_MAX
+
+# Sem cache compartilhado, um registro gravado em um worker não invalidaria os totais dos outros
+export CACHE_BACKEND="${CACHE_BACKEND:-sqlite}"
+if [ "$CACHE_BACKEND" = "memory" ]; then
+  echo "❌ CACHE_BACKEND=memory não é suportado com vários workers (use sqlite ou redis)." >&2
+  exit 1
+fi
+
+if [ -z "${SESSION_SECRET:-}" ]; then
+  echo "⚠️  SESSION_SECRET não definida: cada worker usará uma chave própria." >&2
+fi
+
+cd "$(dirname "$0")/.."
+
+pids=()
+stop_workers() {
+  kill "${pids[@]}" 2>/dev/null || true
+  wait || true
+}
+trap stop_workers INT TERM EXIT
+
+echo "🚀 Iniciando $WORKERS workers (portas $BASE_PORT-$(( BASE_PORT + WORKERS - 1 )), $DB_POOL_MAX conexões cada, cache $CACHE_BACKEND)"
+for i in $(seq 0 $(( WORKERS - 1 ))); do
+  # Cada worker expõe suas métricas em METRICS_PORT + i
+  METRICS_PORT="${METRICS_PORT:+$(( METRICS_PORT + i ))}" \
+  streamlit run main.py \
+    --server.port $(( BASE_PORT + i )) \
+    --server.address 127.0.0.1 \
+    --server.headless true \
+    --browser.gatherUsageStats false &
+  pids+=($!)
+done
+
+# Se um worker cair, derruba os demais para o supervisor reiniciar o conjunto
+wait -n
@@ -1,11 +1,15 @@
 import streamlit as st
-import psycopg2
-import bcrypt
 import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, date, timedelta
+from datetime import date, timedelta
 import os
+import tempfile
+
+from sgpgf import analytics, config, directory, export, frames, ingest, live, metrics, repository, schema, security, writebehind
+from sgpgf.analytics import PRODUCTIVITY_FORMATS
+from sgpgf.config import REPORT_DAYS, SLOW_QUERY_MS, WORK_TYPES
+from sgpgf.export import EXPORT_FORMATS
+from sgpgf.models import EMPTY_DAILY_STATS, EMPTY_REPORT, EMPTY_WEIGHT_SUMMARY, RecordsPage
 
 # Configuração da página
 st.set_page_config(
@@ -15,252 +19,167 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Conexão com o banco de dados
-@st.cache_resource
-def get_db_connection():
-    database_url = os.getenv("DATABASE_URL")
-    if not database_url:
-        st.error("DATABASE_URL não configurada. Verifique as variáveis de ambiente.")
-        st.stop()
-    try:
-        return psycopg2.connect(database_url)
-    except Exception as e:
-        st.error(f"Erro ao conectar com o banco: {str(e)}")
-        st.stop()
+# O acesso a dados fica no pacote sgpgf; aqui as falhas viram mensagens na
+# tela e a página segue com valores vazios
 
 # Inicializar tabelas
 def init_database():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Criar tabela users
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                cpf VARCHAR(11) UNIQUE NOT NULL,
-                password VARCHAR(255),
-                first_name VARCHAR(100) NOT NULL,
-                last_name VARCHAR(100) NOT NULL,
-                email VARCHAR(255),
-                profile_image_url TEXT,
-                is_admin BOOLEAN DEFAULT FALSE,
-                work_type VARCHAR(50) NOT NULL,
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Criar tabela weight_records
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS weight_records (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id),
-                weight DECIMAL(10,2) NOT NULL,
-                work_type VARCHAR(50) NOT NULL,
-                notes TEXT,
-                record_date DATE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        schema.ensure_schema()
     except Exception as e:
         st.error(f"Erro ao inicializar banco: {str(e)}")
 
-# Funções de autenticação
-def hash_password(password):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-def verify_password(password, hashed):
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-
+# Login e filtro de usuários consultam o diretório em memória, recarregado
+# só quando os usuários mudam
 def get_user_by_cpf(cpf):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, cpf, password, first_name, last_name, email, 
-                   profile_image_url, is_admin, work_type, is_active
-            FROM users WHERE cpf = %s AND is_active = true
-        """, (cpf,))
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
-
-        if result:
-            return {
-                'id': result[0], 'cpf': result[1], 'password': result[2],
-                'first_name': result[3], 'last_name': result[4], 'email': result[5],
-                'profile_image_url': result[6], 'is_admin': result[7],
-                'work_type': result[8], 'is_active': result[9]
-            }
-        return None
+        return directory.get_user_directory().find_by_cpf(cpf)
     except Exception as e:
         st.error(f"Erro ao buscar usuário: {str(e)}")
         return None
 
 def create_user(cpf, password, first_name, last_name, email, is_admin, work_type):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        hashed_password = hash_password(password) if password else ""
-        cursor.execute("""
-            INSERT INTO users (cpf, password, first_name, last_name, email, is_admin, work_type)
-            VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id
-        """, (cpf, hashed_password, first_name, last_name, email, is_admin, work_type))
-        user_id = cursor.fetchone()[0]
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return user_id
+        return repository.create_user(cpf, password, first_name, last_name, email, is_admin, work_type)
     except Exception as e:
         st.error(f"Erro ao criar usuário: {str(e)}")
         return None
 
+def update_password_hash(user_id, hashed):
+    try:
+        repository.update_password_hash(user_id, hashed)
+    except Exception as e:
+        st.error(f"Erro ao atualizar senha: {str(e)}")
+
 def create_weight_record(user_id, weight, work_type, notes, record_date):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO weight_records (user_id, weight, work_type, notes, record_date)
-            VALUES (%s, %s, %s, %s, %s) RETURNING id
-        """, (user_id, weight, work_type, notes, record_date))
-        record_id = cursor.fetchone()[0]
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return record_id
+        # Com a fila local ativa, o registro é confirmado na hora e enviado depois
+        queue = writebehind.start_write_behind()
+        if queue:
+            return queue.enqueue(user_id, weight, work_type, notes, record_date)
+        return repository.create_weight_record(user_id, weight, work_type, notes, record_date)
     except Exception as e:
         st.error(f"Erro ao criar registro: {str(e)}")
         return None
 
-def get_user_stats(user_id):
+def get_weight_summary(user_id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Peso de hoje
-        cursor.execute("""
-            SELECT COALESCE(SUM(weight), 0) FROM weight_records 
-            WHERE user_id = %s AND record_date = CURRENT_DATE
-        """, (user_id,))
-        today_weight = cursor.fetchone()[0]
-
-        # Peso do mês
-        cursor.execute("""
-            SELECT COALESCE(SUM(weight), 0) FROM weight_records 
-            WHERE user_id = %s AND DATE_TRUNC('month', record_date) = DATE_TRUNC('month', CURRENT_DATE)
-        """, (user_id,))
-        monthly_weight = cursor.fetchone()[0]
-
-        # Média semanal
-        cursor.execute("""
-            SELECT COALESCE(AVG(weight), 0) FROM weight_records 
-            WHERE user_id = %s AND record_date >= CURRENT_DATE - INTERVAL '7 days'
-        """, (user_id,))
-        weekly_average = cursor.fetchone()[0]
-
-        cursor.close()
-        conn.close()
-
-        return {
-            'today_weight': float(today_weight),
-            'monthly_weight': float(monthly_weight),
-            'weekly_average': float(weekly_average)
-        }
+        return repository.get_weight_summary(user_id)
     except Exception as e:
         st.error(f"Erro ao obter estatísticas: {str(e)}")
-        return {'today_weight': 0, 'monthly_weight': 0, 'weekly_average': 0}
+        return EMPTY_WEIGHT_SUMMARY
 
-def get_weight_records(user_id=None, start_date=None, end_date=None):
+def get_weight_records_page(user_id=None, start_date=None, end_date=None, after=None):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        query = """
-            SELECT wr.id, wr.weight, wr.work_type, wr.notes, wr.record_date,
-                   u.first_name, u.last_name, u.cpf
-            FROM weight_records wr
-            JOIN users u ON wr.user_id = u.id WHERE 1=1
-        """
-        params = []
-
-        if user_id:
-            query += " AND wr.user_id = %s"
-            params.append(user_id)
-        if start_date:
-            query += " AND wr.record_date >= %s"
-            params.append(start_date)
-        if end_date:
-            query += " AND wr.record_date <= %s"
-            params.append(end_date)
-
-        query += " ORDER BY wr.record_date DESC, wr.id DESC"
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return results
+        return repository.get_weight_records_page(user_id, start_date, end_date, after)
     except Exception as e:
         st.error(f"Erro ao obter registros: {str(e)}")
+        return RecordsPage([], None)
+
+def get_weight_history(user_id, max_points):
+    try:
+        return repository.get_weight_history(user_id, max_points)
+    except Exception as e:
+        st.error(f"Erro ao obter histórico: {str(e)}")
         return []
 
+def get_weight_series(user_id, start_date, resolution, by_type=False):
+    try:
+        return repository.get_weight_series(user_id, start_date, resolution, by_type)
+    except Exception as e:
+        st.error(f"Erro ao obter série: {str(e)}")
+        return []
+
+def get_report_rollups(start_date):
+    try:
+        return repository.get_report_rollups(start_date)
+    except Exception as e:
+        st.error(f"Erro ao obter relatórios: {str(e)}")
+        return EMPTY_REPORT
+
+def get_productivity(period_kind, start_date, end_date, user_id=None, work_type=None):
+    try:
+        return analytics.get_productivity(period_kind, start_date, end_date, user_id, work_type)
+    except Exception as e:
+        st.error(f"Erro ao obter produtividade: {str(e)}")
+        return []
+
+def get_analytics_last_run():
+    try:
+        return analytics.get_last_run()
+    except Exception as e:
+        st.error(f"Erro ao consultar os resumos de produtividade: {str(e)}")
+        return None
+
+def run_productivity_job():
+    try:
+        return analytics.run_productivity_job()
+    except Exception as e:
+        st.error(f"Erro ao atualizar os resumos de produtividade: {str(e)}")
+        return None
+
+def get_user_options():
+    try:
+        return directory.get_user_directory().user_options()
+    except Exception as e:
+        st.error(f"Erro ao obter usuários: {str(e)}")
+        return {}
+
 def get_all_users():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, cpf, first_name, last_name, email, is_admin, work_type, is_active
-            FROM users ORDER BY first_name, last_name
-        """)
-        results = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return results
+        return repository.get_all_users()
     except Exception as e:
         st.error(f"Erro ao obter usuários: {str(e)}")
         return []
 
 def get_daily_stats():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Usuários ativos hoje
-        cursor.execute("""
-            SELECT COUNT(DISTINCT user_id) FROM weight_records 
-            WHERE record_date = CURRENT_DATE
-        """)
-        active_users = cursor.fetchone()[0]
-
-        # Peso total hoje
-        cursor.execute("""
-            SELECT COALESCE(SUM(weight), 0) FROM weight_records 
-            WHERE record_date = CURRENT_DATE
-        """)
-        today_weight = cursor.fetchone()[0]
-
-        # Peso total do mês
-        cursor.execute("""
-            SELECT COALESCE(SUM(weight), 0) FROM weight_records 
-            WHERE DATE_TRUNC('month', record_date) = DATE_TRUNC('month', CURRENT_DATE)
-        """)
-        monthly_weight = cursor.fetchone()[0]
-
-        cursor.close()
-        conn.close()
-
-        return {
-            'active_users': active_users,
-            'today_weight': float(today_weight),
-            'monthly_weight': float(monthly_weight)
-        }
+        return repository.get_daily_stats()
     except Exception as e:
         st.error(f"Erro ao obter estatísticas diárias: {str(e)}")
-        return {'active_users': 0, 'today_weight': 0, 'monthly_weight': 0}
+        return EMPTY_DAILY_STATS
+
+def start_metrics_server():
+    try:
+        metrics.start_metrics_server()
+    except Exception as e:
+        st.error(f"Erro ao iniciar o endpoint de métricas: {str(e)}")
+
+def start_write_behind():
+    try:
+        writebehind.start_write_behind()
+    except Exception as e:
+        st.error(f"Erro ao abrir a fila de gravação: {str(e)}")
+
+def start_live_feed():
+    try:
+        live.start_live_feed()
+    except Exception as e:
+        st.error(f"Erro ao iniciar a atualização ao vivo: {str(e)}")
+
+# Indicadores e registros mantidos em memória pelo listener; None quando a
+# atualização ao vivo está desligada ou sem conexão
+def get_live_snapshot():
+    feed = live.start_live_feed()
+    return feed.snapshot() if feed else None
+
+def get_sync_status(user_id):
+    try:
+        return writebehind.start_write_behind().recent(user_id)
+    except Exception as e:
+        st.error(f"Erro ao ler a fila de gravação: {str(e)}")
+        return []
+
+def start_session(user, login_type):
+    # O hash da senha não fica no session_state
+    st.session_state.user = user._replace(password=None)
+    st.session_state.login_type = login_type
+    st.session_state.session_token = security.issue_session_token(user.id, login_type)
+
+def end_session():
+    st.session_state.user = None
+    st.session_state.login_type = None
+    st.session_state.session_token = None
 
 def main():
     # CSS customizado
@@ -283,9 +202,6 @@ def main():
     </style>
     """, unsafe_allow_html=True)
 
-    # Inicializar banco de dados
-    init_database()
-
     # Header
     st.markdown("""
     <div class="main-header">
@@ -300,12 +216,25 @@ def main():
         st.info("Configure a variável DATABASE_URL no painel de Secrets do Replit.")
         st.stop()
 
+    # Inicializar banco de dados e threads do processo
+    init_database()
+    start_metrics_server()
+    start_write_behind()
+    start_live_feed()
+
     # Session state
     if 'user' not in st.session_state:
         st.session_state.user = None
     if 'login_type' not in st.session_state:
         st.session_state.login_type = None
 
+    # Sessão expirada ou adulterada: volta para o login
+    if st.session_state.user is not None and not security.session_token_valid(
+            st.session_state.get('session_token'), st.session_state.user.id,
+            st.session_state.login_type):
+        end_session()
+        st.warning("Sessão expirada. Faça login novamente.")
+
     # Sidebar de login
     with st.sidebar:
         st.markdown('<div class="sidebar-header"><h2>🔐 Acesso</h2></div>', unsafe_allow_html=True)
@@ -325,19 +254,20 @@ def main():
                         user = get_user_by_cpf(cpf)
                         if user:
                             if login_type == "Administrador":
-                                if user['is_admin'] and password:
-                                    if verify_password(password, user['password']):
-                                        st.session_state.user = user
-                                        st.session_state.login_type = "admin"
+                                if user.is_admin and password:
+                                    if security.verify_password(password, user.password):
+                                        # Atualiza o custo do hash de forma transparente
+                                        if security.password_needs_rehash(user.password):
+                                            update_password_hash(user.id, security.hash_password(password))
+                                        start_session(user, "admin")
                                         st.rerun()
                                     else:
                                         st.error("Senha incorreta!")
                                 else:
                                     st.error("Usuário não é admin!")
                             else:
-                                if not user['is_admin']:
-                                    st.session_state.user = user
-                                    st.session_state.login_type = "user"
+                                if not user.is_admin:
+                                    start_session(user, "user")
                                     st.rerun()
                                 else:
                                     st.error("Admin deve usar login de admin!")
@@ -347,16 +277,15 @@ def main():
             user = st.session_state.user
             st.markdown(f"""
             <div class="sidebar-header">
-                <h3>👤 {user['first_name']} {user['last_name']}</h3>
-                <p><strong>CPF:</strong> {user['cpf']}</p>
-                <p><strong>Tipo:</strong> {user['work_type']}</p>
-                <p><strong>Perfil:</strong> {'Admin' if user['is_admin'] else 'Funcionário'}</p>
+                <h3>👤 {user.full_name}</h3>
+                <p><strong>CPF:</strong> {user.cpf}</p>
+                <p><strong>Tipo:</strong> {user.work_type}</p>
+                <p><strong>Perfil:</strong> {'Admin' if user.is_admin else 'Funcionário'}</p>
             </div>
             """, unsafe_allow_html=True)
 
             if st.button("🚪 Logout"):
-                st.session_state.user = None
-                st.session_state.login_type = None
+                end_session()
                 st.rerun()
 
     # Conteúdo principal
@@ -376,18 +305,134 @@ def main():
             **🔒 Faça login na sidebar!**
             """)
 
+def show_export_controls(user_id=None, start_date=None, end_date=None):
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        export_format = st.selectbox("Formato:", list(EXPORT_FORMATS.keys()))
+
+    # O arquivo só é gerado quando solicitado e é apagado logo após ser entregue
+    if st.button("📥 Exportar"):
+        extension, mime = EXPORT_FORMATS[export_format]
+        path = None
+        try:
+            # Dentro do try: EXPORT_DIR ausente ou sem permissão vira erro na tela
+            handle, path = tempfile.mkstemp(suffix=f".{extension}", dir=config.EXPORT_DIR)
+            os.close(handle)
+            export.export_weight_records(path, export_format, user_id, start_date, end_date)
+            # O Streamlit guarda o arquivo inteiro em memória até o fim da sessão
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            if size_mb > config.EXPORT_MAX_DOWNLOAD_MB:
+                st.error(f"Arquivo de {size_mb:.0f} MB excede o limite de download "
+                         f"({config.EXPORT_MAX_DOWNLOAD_MB:.0f} MB). Reduza o período, use CSV (gzip) "
+                         f"ou exporte com `python -m sgpgf.export`.")
+            else:
+                with open(path, 'rb') as fileobj:
+                    st.download_button(f"💾 Baixar {export_format}", fileobj,
+                                       f"registros_{start_date}_{end_date}.{extension}", mime)
+        except Exception as e:
+            st.error(f"Erro ao exportar registros: {str(e)}")
+        finally:
+            if path:
+                os.remove(path)
+
+# Paginação das tabelas: a pilha de chaves de cada tabela fica no session_state
+# e é reiniciada sempre que os filtros mudam
+def get_records_page(key, user_id=None, start_date=None, end_date=None):
+    filters = (user_id, start_date, end_date)
+    if st.session_state.get(f"{key}_filters") != filters:
+        st.session_state[f"{key}_filters"] = filters
+        st.session_state[f"{key}_keys"] = [None]
+
+    page_keys = st.session_state[f"{key}_keys"]
+    return get_weight_records_page(user_id, start_date, end_date, after=page_keys[-1])
+
+def show_page_controls(key, next_key):
+    page_keys = st.session_state[f"{key}_keys"]
+
+    def previous_page():
+        page_keys.pop()
+
+    def next_page():
+        page_keys.append(next_key)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("◀ Anterior", key=f"{key}_prev", on_click=previous_page,
+                  disabled=len(page_keys) == 1)
+    with col2:
+        st.caption(f"Página {len(page_keys)}")
+    with col3:
+        st.button("Próxima ▶", key=f"{key}_next", on_click=next_page,
+                  disabled=next_key is None)
+
+SYNC_STATUS_LABELS = {
+    writebehind.PENDING: "⏳ Pendente",
+    writebehind.SYNCED: "✅ Sincronizado",
+    writebehind.FAILED: "❌ Rejeitado",
+}
+
+def show_sync_status(user_id):
+    queued = get_sync_status(user_id)
+    pending = sum(1 for record in queued if record.status == writebehind.PENDING)
+    label = f"🔄 Envios recentes ({pending} pendentes)" if pending else "🔄 Envios recentes"
+    if queued:
+        with st.expander(label, expanded=pending > 0):
+            df = pd.DataFrame(queued, columns=queued[0]._fields)
+            df['Enviado em'] = df['created_at'].dt.strftime('%d/%m %H:%M')
+            df['Data'] = pd.to_datetime(df['record_date']).dt.strftime('%d/%m/%Y')
+            df['Status'] = df['status'].map(SYNC_STATUS_LABELS)
+            df = df.rename(columns={'weight': 'Peso', 'work_type': 'Tipo', 'last_error': 'Erro'})
+            st.dataframe(df[['Enviado em', 'Data', 'Peso', 'Tipo', 'Status', 'Erro']],
+                         use_container_width=True, hide_index=True)
+            if pending:
+                st.caption("Registros pendentes entram nas estatísticas e no histórico após a sincronização.")
+
+# Resolução dos gráficos: cada opção devolve no máximo CHART_MAX_POINTS
+# pontos por linha, já agregados ou reduzidos no servidor
+CHART_RESOLUTIONS = {"Dia": "day", "Semana": "week", "Mês": "month"}
+CHART_PERIODS = {"30 dias": 30, "90 dias": 90, "1 ano": 365, "Tudo": None}
+
+def series_frame(points):
+    df = pd.DataFrame(points, columns=['Data', 'Peso', 'Registros', 'Tipo'])
+    df['Data'] = pd.to_datetime(df['Data'])
+    return df
+
+def show_weight_chart(user, summary):
+    resolution = st.radio("Resolução:", [*CHART_RESOLUTIONS, "Registros"], horizontal=True,
+                          key="user_chart_resolution")
+
+    if resolution == "Dia":
+        # Últimos dias direto do resumo, sem consulta extra
+        df_chart = pd.DataFrame(summary.recent_days, columns=['Data', 'Peso', 'Registros'])
+        df_chart['Data'] = pd.to_datetime(df_chart['Data'])
+        title = 'Evolução do Peso (total por dia)'
+    elif resolution == "Registros":
+        df_chart = pd.DataFrame(get_weight_history(user.id, config.CHART_MAX_POINTS),
+                                columns=['Data', 'Peso'])
+        df_chart['Data'] = pd.to_datetime(df_chart['Data'])
+        title = 'Evolução do Peso (por registro)'
+    else:
+        df_chart = series_frame(get_weight_series(user.id, None, CHART_RESOLUTIONS[resolution]))
+        title = f'Evolução do Peso (total por {resolution.lower()})'
+
+    if not df_chart.empty:
+        fig = px.line(df_chart, x='Data', y='Peso', title=title, markers=True)
+        st.plotly_chart(fig, use_container_width=True)
+
 def show_user_dashboard(user):
     st.markdown("## 📊 Dashboard do Funcionário")
 
-    stats = get_user_stats(user['id'])
+    # Métricas e gráfico vêm do resumo do funcionário: uma leitura por chave primária
+    summary = get_weight_summary(user.id)
+    stats = summary.stats
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        st.metric("🎯 Peso Hoje", f"{stats['today_weight']:.1f} kg")
+        st.metric("🎯 Peso Hoje", f"{stats.today_weight:.1f} kg")
     with col2:
-        st.metric("📅 Peso do Mês", f"{stats['monthly_weight']:.1f} kg")
+        st.metric("📅 Peso do Mês", f"{stats.monthly_weight:.1f} kg")
     with col3:
-        st.metric("📊 Média Semanal", f"{stats['weekly_average']:.1f} kg")
+        st.metric("📊 Média Semanal", f"{stats.weekly_average:.1f} kg")
 
     st.divider()
 
@@ -397,165 +442,368 @@ def show_user_dashboard(user):
         col1, col2 = st.columns(2)
         with col1:
             weight = st.number_input("Peso (kg):", min_value=0.1, step=0.1)
-            work_type = st.selectbox("Tipo:", ["Filetagem", "Espinhos"])
+            work_type = st.selectbox("Tipo:", WORK_TYPES)
         with col2:
             record_date = st.date_input("Data:", value=date.today())
             notes = st.text_area("Observações:")
 
         if st.form_submit_button("💾 Salvar"):
             if weight > 0:
-                if create_weight_record(user['id'], weight, work_type, notes, record_date):
+                if create_weight_record(user.id, weight, work_type, notes, record_date):
                     st.success("✅ Salvo!")
                     st.rerun()
             else:
                 st.error("Peso deve ser > 0!")
 
+    if config.WRITE_BEHIND:
+        show_sync_status(user.id)
+
     st.divider()
 
     # Histórico
     st.markdown("### 📋 Meus Registros")
-    records = get_weight_records(user_id=user['id'])
+    records, next_key = get_records_page("user_records", user_id=user.id)
 
     if records:
-        df = pd.DataFrame(records, columns=[
-            'ID', 'Peso', 'Tipo', 'Obs', 'Data', 'Nome', 'Sobrenome', 'CPF'
-        ])
-
-        # Gráfico
-        df_chart = df.copy()
-        df_chart['Data'] = pd.to_datetime(df_chart['Data'])
-        df_chart = df_chart.sort_values('Data')
-
-        fig = px.line(df_chart, x='Data', y='Peso', title='Evolução do Peso', markers=True)
-        st.plotly_chart(fig, use_container_width=True)
+        show_weight_chart(user, summary)
 
         # Tabela
-        display_df = df[['Data', 'Peso', 'Tipo', 'Obs']].copy()
-        display_df['Data'] = pd.to_datetime(display_df['Data']).dt.strftime('%d/%m/%Y')
-        st.dataframe(display_df, use_container_width=True)
+        st.dataframe(records_table(records, with_employee=False), use_container_width=True)
+        show_page_controls("user_records", next_key)
     else:
         st.info("Nenhum registro encontrado!")
 
 def show_admin_dashboard():
     st.markdown("## 👑 Dashboard Admin")
+    show_admin_metrics()
+
+    # Navegação por seção: só a seção ativa executa consultas e monta
+    # gráficos (st.tabs executaria todas a cada interação)
+    sections = {
+        "📊 Registros": show_records_section,
+        "👥 Usuários": show_users_section,
+        "➕ Novo User": show_create_user_section,
+        "📈 Relatórios": show_reports_section,
+        "🏭 Produtividade": show_productivity_section,
+        "📤 Importar": show_import_section,
+        "🩺 Diagnóstico": show_diagnostics_section,
+    }
+    section = st.radio("Seção:", list(sections.keys()), horizontal=True,
+                       key="admin_section", label_visibility="collapsed")
+    st.divider()
+    sections[section]()
 
-    stats = get_daily_stats()
-    col1, col2, col3, col4 = st.columns(4)
+# Intervalo dos fragmentos ao vivo: só eles reexecutam, não a página inteira
+LIVE_RUN_EVERY = config.LIVE_REFRESH_SECONDS if config.LIVE_REFRESH_SECONDS > 0 else None
+
+@st.fragment(run_every=LIVE_RUN_EVERY)
+def show_admin_metrics():
+    snapshot = get_live_snapshot()
+    stats = snapshot.stats if snapshot else get_daily_stats()
+    col1, col2, col3, col4, col5 = st.columns(5)
 
     with col1:
-        st.metric("👥 Ativos Hoje", stats['active_users'])
+        st.metric("👥 Ativos Hoje", stats.active_users)
     with col2:
-        st.metric("⚖️ Peso Hoje", f"{stats['today_weight']:.1f} kg")
+        st.metric("⚖️ Peso Hoje", f"{stats.today_weight:.1f} kg")
     with col3:
-        st.metric("📅 Peso Mês", f"{stats['monthly_weight']:.1f} kg")
+        st.metric("📅 Peso Mês", f"{stats.monthly_weight:.1f} kg")
     with col4:
-        st.metric("👤 Total Users", len(get_all_users()))
+        st.metric("📊 Média Semanal", f"{stats.weekly_average:.1f} kg")
+    with col5:
+        st.metric("👤 Total Users", stats.total_users)
+
+    if snapshot:
+        st.caption(f"🔴 Ao vivo · atualizado às {snapshot.updated_at:%H:%M:%S}")
+
+# Tabelas de exibição: colunas tipadas de sgpgf.frames, formatadas uma vez
+# por operações vetorizadas
+def records_table(records, with_employee=True):
+    df = frames.records_frame(records)
+    table = {'Data': df['record_date'].dt.strftime('%d/%m/%Y')}
+    if with_employee:
+        table['Funcionário'] = df['first_name'].str.cat(df['last_name'], sep=' ')
+        table['CPF'] = df['cpf']
+    table.update(Peso=df['weight'], Tipo=df['work_type'], Obs=df['notes'])
+    return pd.DataFrame(table)
+
+def users_table(users):
+    df = frames.users_frame(users)
+    return pd.DataFrame({
+        'CPF': df['cpf'],
+        'Nome': df['first_name'],
+        'Sobrenome': df['last_name'],
+        'Email': df['email'],
+        'Perfil': df['is_admin'].map({True: 'Admin', False: 'User'}),
+        'Tipo': df['work_type'],
+        'Status': df['is_active'].map({True: 'Ativo', False: 'Inativo'}),
+    })
+
+@st.fragment(run_every=LIVE_RUN_EVERY)
+def show_live_records():
+    snapshot = get_live_snapshot()
+    if not snapshot or not snapshot.records:
+        return
+    st.markdown("#### 🔴 Últimos lançamentos")
+    st.dataframe(records_table(snapshot.records), use_container_width=True)
+
+def show_records_section():
+    show_live_records()
+    st.markdown("### 📋 Todos os Registros")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        user_options = get_user_options()
+        user_options["Todos"] = None
+        selected_user = st.selectbox("Usuário:", list(user_options.keys()))
+        user_id_filter = user_options[selected_user]
+
+    with col2:
+        start_date = st.date_input("De:", value=date.today() - timedelta(days=30))
+    with col3:
+        end_date = st.date_input("Até:", value=date.today())
+
+    records, next_key = get_records_page("admin_records", user_id_filter, start_date, end_date)
+
+    if records:
+        st.dataframe(records_table(records), use_container_width=True)
+        show_page_controls("admin_records", next_key)
 
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Registros", "👥 Usuários", "➕ Novo User", "📈 Relatórios"])
+        # Exportação completa do período filtrado
+        show_export_controls(user_id_filter, start_date, end_date)
+    else:
+        st.info("Nenhum registro!")
 
-    with tab1:
-        st.markdown("### 📋 Todos os Registros")
+def show_users_section():
+    st.markdown("### 👥 Usuários")
+    users = get_all_users()
+    if users:
+        st.dataframe(users_table(users), use_container_width=True)
 
-        col1, col2, col3 = st.columns(3)
+def show_create_user_section():
+    st.markdown("### ➕ Criar Usuário")
+    with st.form("create_user_form"):
+        col1, col2 = st.columns(2)
         with col1:
-            users = get_all_users()
-            user_options = {f"{u[2]} {u[3]} ({u[1]})": u[0] for u in users}
-            user_options["Todos"] = None
-            selected_user = st.selectbox("Usuário:", list(user_options.keys()))
-            user_id_filter = user_options[selected_user]
+            cpf = st.text_input("CPF:", max_chars=11)
+            first_name = st.text_input("Nome:")
+            last_name = st.text_input("Sobrenome:")
+        with col2:
+            email = st.text_input("Email:")
+            work_type = st.selectbox("Tipo:", WORK_TYPES)
+            is_admin = st.checkbox("É Admin?")
+
+        password = st.text_input("Senha (obrig. p/ admin):", type="password")
+
+        if st.form_submit_button("👤 Criar"):
+            if len(cpf) != 11 or not cpf.isdigit():
+                st.error("CPF deve ter 11 dígitos!")
+            elif not first_name or not last_name:
+                st.error("Nome obrigatório!")
+            elif is_admin and not password:
+                st.error("Senha obrigatória para admin!")
+            else:
+                user_id = create_user(cpf, password, first_name, last_name, email, is_admin, work_type)
+                if user_id:
+                    st.success(f"✅ Criado! ID: {user_id}")
+                    st.rerun()
+
+def show_reports_section():
+    st.markdown("### 📈 Relatórios")
+    report = get_report_rollups(date.today() - timedelta(days=REPORT_DAYS - 1))
 
+    if report.by_type:
+        # Pizza por tipo
+        work_stats = pd.DataFrame(report.by_type, columns=['Tipo', 'Peso'])
+        fig_pie = px.pie(work_stats, values='Peso', names='Tipo', title='Por Tipo')
+        st.plotly_chart(fig_pie, use_container_width=True)
+
+        # Linha por período
+        col1, col2 = st.columns(2)
+        with col1:
+            period = st.selectbox("Período:", list(CHART_PERIODS), key="report_period")
         with col2:
-            start_date = st.date_input("De:", value=date.today() - timedelta(days=30))
-        with col3:
-            end_date = st.date_input("Até:", value=date.today())
+            resolution = st.radio("Resolução:", list(CHART_RESOLUTIONS), horizontal=True,
+                                  key="report_resolution")
+        days = CHART_PERIODS[period]
+        start_date = date.today() - timedelta(days=days - 1) if days else None
+        daily_stats = series_frame(get_weight_series(None, start_date, CHART_RESOLUTIONS[resolution],
+                                                     by_type=True))
+        fig_line = px.line(daily_stats, x='Data', y='Peso', color='Tipo',
+                           title=f'Total por {resolution.lower()}', markers=True)
+        st.plotly_chart(fig_line, use_container_width=True)
+
+        # Top funcionários
+        top_users = pd.DataFrame(report.top_users, columns=['Funcionário', 'Peso'])
+
+        fig_bar = px.bar(top_users, x='Peso', y='Funcionário', orientation='h',
+                       title='Top 10', labels={'Peso': 'Peso (kg)'})
+        st.plotly_chart(fig_bar, use_container_width=True)
+
+def productivity_table(rows):
+    df = frames.productivity_frame(rows)
+    return pd.DataFrame({
+        'Início': df['period_start'].dt.strftime('%d/%m/%Y'),
+        'Funcionário': df['first_name'].str.cat(df['last_name'], sep=' '),
+        'Tipo': df['work_type'],
+        'Peso (kg)': df['total_weight'],
+        'Registros': df['record_count'],
+        'Percentil': (df['percentile_rank'] * 100).round(),
+        'Tendência (%)': (df['trend'] * 100).round(1),
+    })
+
+# Lê só os resumos pré-calculados por sgpgf.analytics
+def show_productivity_section():
+    st.markdown("### 🏭 Produtividade")
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        period = st.radio("Período:", list(CHART_RESOLUTIONS), horizontal=True, key="productivity_period")
+    with col2:
+        start_date = st.date_input("De:", value=date.today() - timedelta(days=config.ANALYTICS_DEFAULT_DAYS),
+                                   key="productivity_start")
+    with col3:
+        end_date = st.date_input("Até:", value=date.today(), key="productivity_end")
+    with col4:
+        user_options = get_user_options()
+        user_options["Todos"] = None
+        selected_user = st.selectbox("Usuário:", list(user_options.keys()), key="productivity_user")
+    with col5:
+        selected_type = st.selectbox("Tipo:", ["Todos", *WORK_TYPES], key="productivity_type")
+    work_type = None if selected_type == "Todos" else selected_type
+
+    last_run = get_analytics_last_run()
+    if last_run:
+        st.caption(f"Resumos calculados em {last_run:%d/%m/%Y %H:%M}")
+    else:
+        st.warning("Resumos ainda não calculados. Use o botão abaixo ou `python -m sgpgf.analytics run`.")
 
-        records = get_weight_records(user_id_filter, start_date, end_date)
+    if st.button("🔄 Atualizar resumos"):
+        groups = run_productivity_job()
+        if groups is not None:
+            st.success(f"{groups} grupos atualizados")
 
-        if records:
-            df = pd.DataFrame(records, columns=[
-                'ID', 'Peso', 'Tipo', 'Obs', 'Data', 'Nome', 'Sobrenome', 'CPF'
-            ])
-            df['Data'] = pd.to_datetime(df['Data']).dt.strftime('%d/%m/%Y')
-            df['Funcionário'] = df['Nome'] + ' ' + df['Sobrenome']
+    rows = get_productivity(CHART_RESOLUTIONS[period], start_date, end_date,
+                            user_options[selected_user], work_type)
+    if not rows:
+        st.info("Nenhum resumo no período!")
+        return
 
-            display_df = df[['Data', 'Funcionário', 'CPF', 'Peso', 'Tipo', 'Obs']]
-            st.dataframe(display_df, use_container_width=True)
+    st.dataframe(productivity_table(rows), use_container_width=True, hide_index=True)
 
-            csv = display_df.to_csv(index=False)
-            st.download_button("📥 CSV", csv, f"registros_{start_date}_{end_date}.csv", "text/csv")
-        else:
-            st.info("Nenhum registro!")
-
-    with tab2:
-        st.markdown("### 👥 Usuários")
-        users = get_all_users()
-        if users:
-            df_users = pd.DataFrame(users, columns=[
-                'ID', 'CPF', 'Nome', 'Sobrenome', 'Email', 'Admin', 'Tipo', 'Ativo'
-            ])
-            df_users['Perfil'] = df_users['Admin'].apply(lambda x: 'Admin' if x else 'User')
-            df_users['Status'] = df_users['Ativo'].apply(lambda x: 'Ativo' if x else 'Inativo')
-
-            display_df = df_users[['CPF', 'Nome', 'Sobrenome', 'Email', 'Perfil', 'Tipo', 'Status']]
-            st.dataframe(display_df, use_container_width=True)
-
-    with tab3:
-        st.markdown("### ➕ Criar Usuário")
-        with st.form("create_user_form"):
-            col1, col2 = st.columns(2)
-            with col1:
-                cpf = st.text_input("CPF:", max_chars=11)
-                first_name = st.text_input("Nome:")
-                last_name = st.text_input("Sobrenome:")
-            with col2:
-                email = st.text_input("Email:")
-                work_type = st.selectbox("Tipo:", ["Filetagem", "Espinhos"])
-                is_admin = st.checkbox("É Admin?")
-
-            password = st.text_input("Senha (obrig. p/ admin):", type="password")
-
-            if st.form_submit_button("👤 Criar"):
-                if len(cpf) != 11 or not cpf.isdigit():
-                    st.error("CPF deve ter 11 dígitos!")
-                elif not first_name or not last_name:
-                    st.error("Nome obrigatório!")
-                elif is_admin and not password:
-                    st.error("Senha obrigatória para admin!")
-                else:
-                    user_id = create_user(cpf, password, first_name, last_name, email, is_admin, work_type)
-                    if user_id:
-                        st.success(f"✅ Criado! ID: {user_id}")
-                        st.rerun()
-
-    with tab4:
-        st.markdown("### 📈 Relatórios")
-        records = get_weight_records()
-
-        if records:
-            df = pd.DataFrame(records, columns=[
-                'ID', 'Peso', 'Tipo', 'Obs', 'Data', 'Nome', 'Sobrenome', 'CPF'
-            ])
-            df['Data'] = pd.to_datetime(df['Data'])
-            last_month = df[df['Data'] >= (datetime.now() - timedelta(days=30))]
-
-            if not last_month.empty:
-                # Pizza por tipo
-                work_stats = last_month.groupby('Tipo')['Peso'].sum().reset_index()
-                fig_pie = px.pie(work_stats, values='Peso', names='Tipo', title='Por Tipo')
-                st.plotly_chart(fig_pie, use_container_width=True)
-
-                # Linha diária
-                daily_stats = last_month.groupby(['Data', 'Tipo'])['Peso'].sum().reset_index()
-                fig_line = px.line(daily_stats, x='Data', y='Peso', color='Tipo', title='Diário', markers=True)
-                st.plotly_chart(fig_line, use_container_width=True)
-
-                # Top funcionários
-                last_month['Funcionário'] = last_month['Nome'] + ' ' + last_month['Sobrenome']
-                top_users = last_month.groupby('Funcionário')['Peso'].sum().sort_values(ascending=False).head(10)
-
-                fig_bar = px.bar(x=top_users.values, y=top_users.index, orientation='h',
-                               title='Top 10', labels={'x': 'Peso (kg)', 'y': 'Funcionário'})
-                st.plotly_chart(fig_bar, use_container_width=True)
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        export_format = st.selectbox("Formato:", list(PRODUCTIVITY_FORMATS), key="productivity_format")
+    # O arquivo só é montado quando solicitado
+    if st.button("📥 Exportar", key="productivity_export"):
+        extension, mime, serialize = PRODUCTIVITY_FORMATS[export_format]
+        st.download_button(f"💾 Baixar {export_format}", serialize(rows),
+                           f"produtividade_{CHART_RESOLUTIONS[period]}_{start_date}_{end_date}.{extension}",
+                           mime)
+
+def show_import_section():
+    st.markdown("### 📤 Importar Registros")
+    st.caption(
+        "CSV ou JSON com as colunas cpf, weight, work_type, record_date "
+        "(AAAA-MM-DD ou DD/MM/AAAA) e notes (opcional). Uma coluna "
+        "idempotency_key, se presente, identifica cada pesagem; "
+        "reimportar um arquivo não duplica registros."
+    )
+    uploaded = st.file_uploader("Arquivo:", type=["csv", "json"])
+
+    if uploaded is not None:
+        try:
+            rows = ingest.parse_import_file(uploaded.name, uploaded.getvalue())
+        except (ValueError, UnicodeDecodeError) as e:
+            st.error(f"Arquivo inválido: {str(e)}")
+            rows = []
+
+        if rows:
+            first_line = ingest.import_first_line(uploaded.name)
+            valid, errors = ingest.validate_import_rows(rows, first_line)
+            st.info(f"{len(rows)} linhas lidas: {len(valid)} válidas, {len(errors)} com erro.")
+            if errors:
+                st.dataframe(pd.DataFrame(errors, columns=['Linha', 'Erro']), use_container_width=True)
+
+            if valid and st.button(f"📤 Importar {len(valid)} registros"):
+                try:
+                    result = ingest.ingest_weight_records(rows, first_line)
+                    st.success(f"✅ {result.inserted} importados, "
+                               f"{result.duplicates} já existentes ignorados.")
+                    if result.errors:
+                        st.warning(f"{len(result.errors)} linhas não importadas:")
+                        st.dataframe(pd.DataFrame(result.errors, columns=['Linha', 'Erro']),
+                                     use_container_width=True)
+                except Exception as e:
+                    st.error(f"Erro ao importar registros: {str(e)}")
+
+def metrics_frame(entries, key_column):
+    rows = [
+        (key, entry['calls'], entry['errors'], entry['rows'], entry['total'] * 1000,
+         entry['total'] * 1000 / entry['calls'], entry['max'] * 1000)
+        for key, entry in entries.items()
+    ]
+    df = pd.DataFrame(rows, columns=[
+        key_column, 'Chamadas', 'Erros', 'Linhas', 'Total (ms)', 'Média (ms)', 'Máx (ms)'
+    ])
+    return df.sort_values('Total (ms)', ascending=False)
+
+def show_diagnostics_section():
+    st.markdown("### 🩺 Diagnóstico")
+    query_metrics = metrics.get_query_metrics()
+    data = query_metrics.snapshot()
+
+    pool_wait = data['pool_wait']
+    cache = data['cache']
+    cache_total = cache['hits'] + cache['misses']
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("🔌 Checkouts do pool", pool_wait['count'])
+    with col2:
+        average_wait = pool_wait['total'] * 1000 / pool_wait['count'] if pool_wait['count'] else 0
+        st.metric("⏳ Espera média", f"{average_wait:.1f} ms")
+    with col3:
+        st.metric("⏱️ Espera máxima", f"{pool_wait['max'] * 1000:.1f} ms")
+    with col4:
+        hit_ratio = cache['hits'] * 100 / cache_total if cache_total else 0
+        st.metric("🗃️ Acertos de cache", f"{hit_ratio:.0f}%")
+
+    if config.WRITE_BEHIND:
+        try:
+            queue_counts = writebehind.start_write_behind().counts()
+            st.caption(f"Fila de gravação: {queue_counts[writebehind.PENDING]} pendentes, "
+                       f"{queue_counts[writebehind.FAILED]} rejeitados, "
+                       f"{queue_counts[writebehind.SYNCED]} sincronizados recentes")
+        except Exception as e:
+            st.error(f"Erro ao ler a fila de gravação: {str(e)}")
+
+    st.markdown("#### Funções")
+    if data['functions']:
+        df = metrics_frame(data['functions'], 'Função').drop(columns=['Linhas'])
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    else:
+        st.info("Nenhuma chamada registrada!")
+
+    st.markdown("#### Comandos SQL")
+    if data['statements']:
+        st.dataframe(metrics_frame(data['statements'], 'Comando'), use_container_width=True, hide_index=True)
+
+    st.markdown(f"#### Consultas lentas (≥ {SLOW_QUERY_MS:.0f} ms)")
+    if data['slow_queries']:
+        for slow in data['slow_queries']:
+            with st.expander(f"{slow['at']:%d/%m %H:%M:%S} · {slow['ms']:.0f} ms"):
+                st.code(slow['statement'], language="sql")
+                if slow['plan']:
+                    st.code(slow['plan'], language="text")
+    else:
+        st.info("Nenhuma consulta lenta!")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("📥 Métricas (Prometheus)", query_metrics.prometheus_text(),
+                           "metrics.txt", "text/plain")
+    with col2:
+        if st.button("🔄 Zerar métricas"):
+            query_metrics.reset()
+            st.rerun()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,9 @@
+"""Camada de acesso a dados do Sistema de Gestão de Peso.
+
+Independente do Streamlit: pode ser importada por jobs em lote, benchmarks
+e scripts. Funções de leitura devolvem registros tipados (``sgpgf.models``)
+e falhas de banco são levantadas como ``DataAccessError``.
+"""
+from sgpgf.errors import ConfigurationError, DataAccessError
+
+__all__ = ["ConfigurationError", "DataAccessError"]
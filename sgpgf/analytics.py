@@ -0,0 +1,197 @@
+"""Resumos de produtividade por funcionário, tipo de trabalho e período.
+
+O job incremental lê de weight_daily_rollup só os dias alterados desde a
+última execução (coluna ``updated_at``, migração 7), recalcula os períodos
+(dia, semana e mês) que contêm esses dias e grava em productivity_summary o
+peso, o número de registros, o percentil do funcionário entre os do mesmo
+tipo e período e a variação em relação ao período anterior. A página de
+produtividade e as exportações leem só essa tabela.
+
+Uso (cron):
+    python -m sgpgf.analytics run
+    python -m sgpgf.analytics run --full
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+from datetime import timedelta
+
+from sgpgf import config
+from sgpgf.cache import cached_query, invalidate_analytics
+from sgpgf.db import get_db_connection
+from sgpgf.metrics import instrumented
+from sgpgf.models import ProductivityRow
+
+logger = logging.getLogger("sgpgf.analytics")
+
+PERIOD_KINDS = ("day", "week", "month")
+JOB_NAME = "productivity"
+# Chave do advisory lock que impede duas execuções simultâneas do job
+ANALYTICS_LOCK = 7243003
+
+def run_productivity_job(full=False):
+    """Atualiza productivity_summary e retorna quantos grupos (período, tipo) foram recalculados.
+
+    Sem execução anterior, ou com ``full``, recalcula todo o histórico. Se
+    outra execução estiver em andamento, não faz nada e retorna 0.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (ANALYTICS_LOCK,))
+        if not cursor.fetchone()[0]:
+            conn.rollback()
+            cursor.close()
+            logger.info("Job de produtividade já em execução em outro processo")
+            return 0
+
+        cursor.execute("SELECT processed_until FROM analytics_runs WHERE job = %s", (JOB_NAME,))
+        row = cursor.fetchone()
+        since = None
+        if row and not full:
+            since = row[0] - timedelta(minutes=config.ANALYTICS_OVERLAP_MINUTES)
+
+        # Grupos (período, tipo) que contêm algum dia alterado
+        cursor.execute("""
+            CREATE TEMP TABLE productivity_affected ON COMMIT DROP AS
+            SELECT DISTINCT kinds.kind AS period_kind,
+                   DATE_TRUNC(kinds.kind, r.record_date)::date AS period_start,
+                   (DATE_TRUNC(kinds.kind, r.record_date) + ('1 ' || kinds.kind)::interval)::date AS period_end,
+                   r.work_type
+            FROM weight_daily_rollup r
+            CROSS JOIN UNNEST(%(kinds)s::text[]) AS kinds(kind)
+            WHERE %(since)s::timestamp IS NULL OR r.updated_at > %(since)s
+        """, {"kinds": list(PERIOD_KINDS), "since": since})
+        affected = cursor.rowcount
+
+        # Totais e percentil de todos os funcionários dos grupos afetados:
+        # um registro novo muda a posição dos demais
+        cursor.execute("""
+            INSERT INTO productivity_summary (period_kind, period_start, user_id, work_type,
+                                              total_weight, record_count, percentile_rank, updated_at)
+            SELECT a.period_kind, a.period_start, r.user_id, a.work_type,
+                   SUM(r.total_weight), SUM(r.record_count),
+                   PERCENT_RANK() OVER (PARTITION BY a.period_kind, a.period_start, a.work_type
+                                        ORDER BY SUM(r.total_weight)),
+                   CURRENT_TIMESTAMP
+            FROM productivity_affected a
+            JOIN weight_daily_rollup r ON r.work_type = a.work_type
+             AND r.record_date >= a.period_start AND r.record_date < a.period_end
+            GROUP BY a.period_kind, a.period_start, a.work_type, r.user_id
+            ON CONFLICT (period_kind, period_start, user_id, work_type) DO UPDATE SET
+                total_weight = EXCLUDED.total_weight,
+                record_count = EXCLUDED.record_count,
+                percentile_rank = EXCLUDED.percentile_rank,
+                updated_at = EXCLUDED.updated_at
+        """)
+
+        # Tendência dos grupos afetados e dos períodos seguintes, cuja base mudou
+        cursor.execute("""
+            UPDATE productivity_summary s
+            SET trend = (
+                SELECT s.total_weight / NULLIF(p.total_weight, 0) - 1
+                FROM productivity_summary p
+                WHERE p.period_kind = s.period_kind AND p.user_id = s.user_id
+                  AND p.work_type = s.work_type
+                  AND p.period_start = (s.period_start - ('1 ' || s.period_kind)::interval)::date
+            )
+            WHERE (s.period_kind, s.period_start, s.work_type) IN (
+                SELECT period_kind, period_start, work_type FROM productivity_affected
+                UNION
+                SELECT period_kind, period_end, work_type FROM productivity_affected
+            )
+        """)
+
+        # CURRENT_TIMESTAMP é o início da transação: dias alterados depois
+        # dele entram na próxima execução
+        cursor.execute("""
+            INSERT INTO analytics_runs (job, processed_until, finished_at)
+            VALUES (%s, CURRENT_TIMESTAMP, clock_timestamp())
+            ON CONFLICT (job) DO UPDATE SET
+                processed_until = EXCLUDED.processed_until,
+                finished_at = EXCLUDED.finished_at
+        """, (JOB_NAME,))
+        conn.commit()
+        cursor.close()
+
+    invalidate_analytics()
+    logger.info("Resumos de produtividade atualizados: %s grupos", affected)
+    return affected
+
+@cached_query(ttl=config.CACHE_TTL_REPORTS, tags=("analytics",))
+@instrumented
+def get_productivity(period_kind, start_date, end_date, user_id=None, work_type=None):
+    """Resumos de ``period_kind`` com início entre as datas, do período mais recente ao mais antigo."""
+    query = """
+        SELECT s.period_kind, s.period_start, s.user_id, u.first_name, u.last_name, s.work_type,
+               s.total_weight, s.record_count, s.percentile_rank, s.trend
+        FROM productivity_summary s
+        JOIN users u ON u.id = s.user_id
+        WHERE s.period_kind = %s AND s.period_start BETWEEN %s AND %s
+    """
+    params = [period_kind, start_date, end_date]
+    if user_id:
+        query += " AND s.user_id = %s"
+        params.append(user_id)
+    if work_type:
+        query += " AND s.work_type = %s"
+        params.append(work_type)
+    query += " ORDER BY s.period_start DESC, s.work_type, s.total_weight DESC"
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        results = [ProductivityRow._make(row) for row in cursor.fetchall()]
+        cursor.close()
+    return results
+
+@cached_query(ttl=config.CACHE_TTL_REPORTS, tags=("analytics",))
+@instrumented
+def get_last_run():
+    """Momento em que o job terminou pela última vez; None se nunca rodou."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT finished_at FROM analytics_runs WHERE job = %s", (JOB_NAME,))
+        row = cursor.fetchone()
+        cursor.close()
+    return row[0] if row else None
+
+def productivity_dicts(rows):
+    """Resumos como dicionários serializáveis, com os campos de ``ProductivityRow``."""
+    return [
+        {**row._asdict(), "period_start": row.period_start.isoformat(),
+         "total_weight": float(row.total_weight)}
+        for row in rows
+    ]
+
+def productivity_csv(rows):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=ProductivityRow._fields)
+    writer.writeheader()
+    writer.writerows(productivity_dicts(rows))
+    return output.getvalue()
+
+def productivity_json(rows):
+    return json.dumps(productivity_dicts(rows), ensure_ascii=False)
+
+# Formato -> (extensão, MIME, serializador)
+PRODUCTIVITY_FORMATS = {
+    "CSV": ("csv", "text/csv", productivity_csv),
+    "JSON": ("json", "application/json", productivity_json),
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m sgpgf.analytics",
+                                     description="Resumos de produtividade por funcionário, tipo e período.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="atualiza os resumos alterados desde a última execução")
+    run.add_argument("--full", action="store_true", help="recalcula todo o histórico")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.command == "run":
+        print(f"{run_productivity_job(args.full)} grupos recalculados")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Cache de consultas com TTL por função e invalidação por etiquetas.
+
+``CACHE_BACKEND`` escolhe onde ficam as entradas: ``memory`` (por processo),
+``sqlite`` (arquivo compartilhado pelos workers da máquina) ou ``redis``.
+"""
+import functools
+import hashlib
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from sgpgf import config
+from sgpgf.errors import ConfigurationError
+from sgpgf.metrics import query_metrics
+
+logger = logging.getLogger("sgpgf.cache")
+
+class QueryCache:
+    """Cache em memória com TTL por entrada e invalidação por etiquetas.
+
+    Cada etiqueta tem uma geração que entra na chave das entradas que
+    dependem dela. Invalidar uma etiqueta incrementa a geração, e as
+    entradas antigas deixam de ser encontradas e expiram pelo TTL. Como as
+    gerações são lidas antes da consulta, um resultado calculado durante
+    uma escrita concorrente nunca é servido depois dela.
+    """
+
+    def __init__(self, max_entries):
+        self._entries = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+
+    def generations(self, tags):
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            return True, value
+
+    def set(self, key, value, ttl):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self._max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] >= now}
+                while len(self._entries) >= self._max_entries:
+                    del self._entries[next(iter(self._entries))]
+            self._entries[key] = (now + ttl, value)
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def shared_key(key):
+    # Chaves são tuplas de argumentos (datas, números, strings): o repr é estável entre processos
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+class SQLiteQueryCache:
+    """Cache compartilhado pelos processos da máquina em um arquivo SQLite (WAL).
+
+    Mesma interface de ``QueryCache``; gerações e valores ficam no arquivo,
+    então uma escrita feita em um worker invalida as entradas de todos.
+    Valores são serializados com pickle: o arquivo deve ser acessível apenas
+    ao app.
+    """
+
+    def __init__(self, path, max_entries):
+        self._path = path
+        self._max_entries = max_entries
+        self._sets = 0
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL,
+                    value BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_cache_entries_expires ON cache_entries (expires_at);
+                CREATE TABLE IF NOT EXISTS cache_generations (
+                    tag TEXT PRIMARY KEY,
+                    generation INTEGER NOT NULL
+                );
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self._path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def generations(self, tags):
+        with closing(self._connect()) as conn:
+            rows = dict(conn.execute(
+                f"SELECT tag, generation FROM cache_generations WHERE tag IN ({','.join('?' * len(tags))})",
+                tuple(tags)
+            ))
+        return tuple(rows.get(tag, 0) for tag in tags)
+
+    def get(self, key):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT expires_at, value FROM cache_entries WHERE key = ?",
+                               (shared_key(key),)).fetchone()
+        if row is None or row[0] < time.time():
+            return False, None
+        return True, pickle.loads(row[1])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO cache_entries (key, expires_at, value) VALUES (?, ?, ?)",
+                         (shared_key(key), now + ttl, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+            # Limpeza periódica: expiradas e, se ainda acima do limite, as que expiram primeiro
+            self._sets += 1
+            if self._sets % 100 == 0:
+                conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (now,))
+                conn.execute("""
+                    DELETE FROM cache_entries WHERE key IN (
+                        SELECT key FROM cache_entries ORDER BY expires_at
+                        LIMIT MAX((SELECT COUNT(*) FROM cache_entries) - ?, 0)
+                    )
+                """, (self._max_entries,))
+
+    def invalidate(self, *tags):
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("""
+                INSERT INTO cache_generations (tag, generation) VALUES (?, 1)
+                ON CONFLICT (tag) DO UPDATE SET generation = generation + 1
+            """, [(tag,) for tag in tags])
+
+    def clear(self):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM cache_entries")
+
+class RedisQueryCache:
+    """Cache compartilhado em um servidor Redis (ou compatível).
+
+    Gerações são contadores (``INCR``) e valores expiram pelo próprio Redis;
+    o limite de memória fica a cargo da política ``maxmemory`` do servidor.
+    """
+
+    def __init__(self, url, prefix="sgpgf"):
+        try:
+            import redis
+        except ImportError:
+            raise ConfigurationError("CACHE_BACKEND=redis requer o pacote redis")
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def generations(self, tags):
+        values = self._redis.mget([f"{self._prefix}:gen:{tag}" for tag in tags])
+        return tuple(int(value or 0) for value in values)
+
+    def get(self, key):
+        raw = self._redis.get(f"{self._prefix}:val:{shared_key(key)}")
+        if raw is None:
+            return False, None
+        return True, pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self._redis.set(f"{self._prefix}:val:{shared_key(key)}",
+                        pickle.dumps(value, pickle.HIGHEST_PROTOCOL), px=max(int(ttl * 1000), 1))
+
+    def invalidate(self, *tags):
+        pipeline = self._redis.pipeline()
+        for tag in tags:
+            pipeline.incr(f"{self._prefix}:gen:{tag}")
+        pipeline.execute()
+
+    def clear(self):
+        keys = list(self._redis.scan_iter(f"{self._prefix}:val:*", count=1000))
+        for start in range(0, len(keys), 1000):
+            self._redis.delete(*keys[start:start + 1000])
+
+def create_query_cache(backend=config.CACHE_BACKEND, url=config.CACHE_URL):
+    if backend == "memory":
+        return QueryCache(config.CACHE_MAX_ENTRIES)
+    if backend == "sqlite":
+        return SQLiteQueryCache(url or "sgpgf_cache.sqlite3", config.CACHE_MAX_ENTRIES)
+    if backend == "redis":
+        if not url:
+            raise ConfigurationError("CACHE_BACKEND=redis requer CACHE_URL (ex.: redis://localhost:6379/0)")
+        return RedisQueryCache(url)
+    raise ConfigurationError(f"CACHE_BACKEND inválido: {backend!r} (use memory, sqlite ou redis)")
+
+query_cache = None
+query_cache_lock = threading.Lock()
+
+def get_query_cache():
+    global query_cache
+    if query_cache is None:
+        with query_cache_lock:
+            if query_cache is None:
+                query_cache = create_query_cache()
+    return query_cache
+
+def cached_query(ttl, tags):
+    """Memoriza o resultado pelos argumentos da chamada durante ``ttl`` segundos.
+
+    ``tags`` é uma tupla de etiquetas ou uma função que recebe os mesmos
+    argumentos e devolve as etiquetas; escritas chamam
+    ``get_query_cache().invalidate`` com as etiquetas afetadas. Exceções não
+    são memorizadas. A função original fica em ``__wrapped__``.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_query_cache()
+            entry_tags = tags(*args, **kwargs) if callable(tags) else tags
+            try:
+                key = (func.__qualname__, args, tuple(sorted(kwargs.items())),
+                       cache.generations(entry_tags))
+                hit, value = cache.get(key)
+            except Exception as e:
+                # Cache compartilhado indisponível: consulta o banco diretamente
+                logger.warning("Cache indisponível em %s: %s", func.__qualname__, e)
+                return func(*args, **kwargs)
+            query_metrics.record_cache(hit)
+            if hit:
+                return value
+            value = func(*args, **kwargs)
+            try:
+                cache.set(key, value, ttl)
+            except Exception as e:
+                logger.warning("Falha ao gravar no cache em %s: %s", func.__qualname__, e)
+            return value
+        return wrapper
+    return decorator
+
+def user_records_tag(user_id):
+    return f"records:user:{user_id}"
+
+def records_cache_tags(user_id=None, *args, **kwargs):
+    # Consultas filtradas por usuário só dependem das escritas desse usuário
+    return (user_records_tag(user_id),) if user_id else ("records",)
+
+# A escrita já foi confirmada quando a invalidação roda: uma falha do cache
+# compartilhado é registrada, e as entradas antigas expiram pelo TTL
+def invalidate_records(*user_ids):
+    try:
+        get_query_cache().invalidate("records", *(user_records_tag(user_id) for user_id in user_ids))
+    except Exception as e:
+        logger.error("Falha ao invalidar o cache de registros: %s", e)
+
+def invalidate_users():
+    try:
+        get_query_cache().invalidate("users")
+    except Exception as e:
+        logger.error("Falha ao invalidar o cache de usuários: %s", e)
+
+def invalidate_analytics():
+    try:
+        get_query_cache().invalidate("analytics")
+    except Exception as e:
+        logger.error("Falha ao invalidar o cache de produtividade: %s", e)
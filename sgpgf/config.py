@@ -0,0 +1,88 @@
+"""Configuração lida das variáveis de ambiente na importação."""
+import os
+
+# Tipos de trabalho aceitos em registros e usuários
+WORK_TYPES = ["Filetagem", "Espinhos"]
+
+# Pool de conexões
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_CHECKOUT_RETRIES = 3
+# Conexões ociosas há mais que isso são testadas (SELECT 1) antes do uso
+DB_POOL_PROBE_IDLE_SECONDS = float(os.getenv("DB_POOL_PROBE_IDLE_SECONDS", "30"))
+
+# Instrumentação
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+METRICS_PORT = os.getenv("METRICS_PORT")
+# Endereço do endpoint de métricas; sem autenticação, então só local por padrão
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_MAX_STATEMENTS = 500
+METRICS_SLOW_QUERIES_KEPT = 50
+
+# Cache de consultas (segundos)
+CACHE_TTL_STATS = int(os.getenv("CACHE_TTL_STATS", "30"))
+CACHE_TTL_RECORDS = int(os.getenv("CACHE_TTL_RECORDS", "60"))
+CACHE_TTL_REPORTS = int(os.getenv("CACHE_TTL_REPORTS", "300"))
+CACHE_TTL_USERS = int(os.getenv("CACHE_TTL_USERS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+# memory (por processo), sqlite (arquivo em CACHE_URL) ou redis (URL em CACHE_URL)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_URL = os.getenv("CACHE_URL")
+
+# Tabelas paginadas e relatórios
+RECORDS_PAGE_SIZE = int(os.getenv("RECORDS_PAGE_SIZE", "50"))
+REPORT_DAYS = 30
+
+# Máximo de pontos por linha enviados aos gráficos
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+
+# Dias de totais diários guardados no resumo de cada funcionário (cobre o
+# mês corrente e a semana mesmo após virar o dia; igual ao da migração 5)
+USER_SUMMARY_DAYS = 62
+
+# Senhas e sessões
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+SESSION_TTL_HOURS = float(os.getenv("SESSION_TTL_HOURS", "12"))
+
+# Importação e exportação
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "50000"))
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+EXPORT_DIR = os.getenv("EXPORT_DIR") or None
+# O download pelo app passa pela memória do Streamlit: arquivos maiores são recusados
+EXPORT_MAX_DOWNLOAD_MB = float(os.getenv("EXPORT_MAX_DOWNLOAD_MB", "50"))
+
+# Fila local de gravação (write-behind): registros são confirmados ao
+# funcionário na hora e enviados ao PostgreSQL em lotes por uma thread
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "").lower() in ("1", "true", "yes", "on")
+WRITE_BEHIND_PATH = os.getenv("WRITE_BEHIND_PATH", "sgpgf_write_behind.sqlite3")
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "500"))
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "2"))
+WRITE_BEHIND_MAX_BACKOFF = 60
+WRITE_BEHIND_RETENTION_HOURS = 24
+
+# Dashboard admin ao vivo: indicadores e últimos registros atualizados por
+# LISTEN/NOTIFY a cada LIVE_REFRESH_SECONDS segundos (0 desliga)
+LIVE_REFRESH_SECONDS = float(os.getenv("LIVE_REFRESH_SECONDS", "5"))
+LIVE_FEED_SIZE = 20
+# Recálculo completo periódico, que corrige o que os incrementos não cobrem
+LIVE_RESYNC_SECONDS = 300
+LIVE_MAX_BACKOFF = 60
+
+# Partições mensais de weight_records
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "24"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+# Resumos de produtividade (sgpgf.analytics): cada execução relê também os
+# dias alterados nos minutos anteriores à última, cobrindo transações que
+# fizeram commit depois dela
+ANALYTICS_OVERLAP_MINUTES = 10
+ANALYTICS_DEFAULT_DAYS = 365
+
+# Espera, após uma falha de migração, antes de o processo tentar de novo
+SCHEMA_RETRY_SECONDS = 300
+
+def database_url():
+    return os.getenv("DATABASE_URL")
@@ -0,0 +1,139 @@
+"""Pool de conexões PostgreSQL compartilhado pelo processo."""
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions as pg_extensions
+from psycopg2 import pool as pg_pool
+
+from sgpgf import config
+from sgpgf.errors import ConfigurationError, DataAccessError
+from sgpgf.metrics import InstrumentedCursor, query_metrics
+
+class DatabasePool:
+    """Pool de conexões thread-safe compartilhado entre as sessões.
+
+    Quando todas as conexões estão em uso, o checkout aguarda até
+    ``timeout`` segundos em vez de falhar imediatamente. Conexões fechadas
+    são descartadas no checkout; só as ociosas há mais de
+    ``DB_POOL_PROBE_IDLE_SECONDS`` são testadas com ``SELECT 1`` (e
+    descartadas, com reconexão, se estiverem quebradas). Uma conexão quebrada
+    devolvida ao pool faz todas as ociosas serem testadas no próximo uso.
+    """
+
+    def __init__(self, dsn, minconn, maxconn, timeout):
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, dsn,
+                                                    cursor_factory=InstrumentedCursor)
+        # O psycopg2 abre ``minconn`` conexões na criação, mas também só mantém
+        # ``minconn`` ociosas e fecha as demais ao serem devolvidas: com o
+        # limite em ``maxconn`` as conexões abertas sob carga são reaproveitadas
+        self._pool.minconn = maxconn
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._timeout = timeout
+        # Momento da última devolução de cada conexão ao pool
+        self._returned_at = {}
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        # Conexão usada há pouco: o teste custaria duas idas ao banco por consulta
+        returned_at = self._returned_at.get(conn)
+        if returned_at is not None and time.monotonic() - returned_at < config.DB_POOL_PROBE_IDLE_SECONDS:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        for _ in range(config.DB_POOL_CHECKOUT_RETRIES):
+            conn = self._pool.getconn()
+            if self._is_healthy(conn):
+                return conn
+            # Conexão quebrada: descarta e tenta novamente com uma nova
+            self._returned_at.pop(conn, None)
+            self._pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError("Não foi possível obter uma conexão saudável do pool")
+
+    def _checkin(self, conn):
+        broken = bool(conn.closed)
+        if not broken:
+            status = conn.get_transaction_status()
+            if status == pg_extensions.TRANSACTION_STATUS_UNKNOWN:
+                broken = True
+            elif status != pg_extensions.TRANSACTION_STATUS_IDLE:
+                # Transação pendente (erro ou leitura sem commit): desfaz antes de devolver
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+        if broken:
+            # Provável queda ou reinício do banco: as demais conexões ociosas
+            # passam a ser testadas antes do uso
+            self._returned_at.clear()
+        else:
+            self._returned_at[conn] = time.monotonic()
+        self._pool.putconn(conn, close=broken)
+        if conn.closed:
+            self._returned_at.pop(conn, None)
+
+    @contextmanager
+    def connection(self):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self._timeout):
+            query_metrics.record_pool_wait(time.perf_counter() - started)
+            raise pg_pool.PoolError("Tempo esgotado aguardando conexão livre no pool")
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+        query_metrics.record_pool_wait(time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            self._checkin(conn)
+            self._slots.release()
+
+    def close(self):
+        self._pool.closeall()
+        self._returned_at.clear()
+
+db_pool = None
+db_pool_lock = threading.Lock()
+
+def get_db_pool():
+    global db_pool
+    if db_pool is None:
+        with db_pool_lock:
+            if db_pool is None:
+                database_url = config.database_url()
+                if not database_url:
+                    raise ConfigurationError("DATABASE_URL não configurada. Verifique as variáveis de ambiente.")
+                try:
+                    db_pool = DatabasePool(database_url, config.DB_POOL_MIN, config.DB_POOL_MAX,
+                                           config.DB_POOL_TIMEOUT)
+                except psycopg2.Error as e:
+                    raise DataAccessError(f"Erro ao conectar com o banco: {str(e)}") from e
+    return db_pool
+
+def close_db_pool():
+    global db_pool
+    with db_pool_lock:
+        if db_pool is not None:
+            db_pool.close()
+            db_pool = None
+
+@contextmanager
+def get_db_connection():
+    """Empresta uma conexão do pool; erros do driver saem como ``DataAccessError``."""
+    try:
+        with get_db_pool().connection() as conn:
+            yield conn
+    except (psycopg2.Error, pg_pool.PoolError) as e:
+        raise DataAccessError(str(e).strip()) from e
@@ -0,0 +1,77 @@
+"""Diretório de usuários em memória para login e filtros.
+
+Uma única consulta carrega todos os usuários; consultas por CPF e por id
+saem de dicionários em memória. O diretório é recarregado quando a etiqueta
+``users`` do cache de consultas muda de geração (``create_user``,
+``update_password_hash`` e qualquer escrita futura que chame
+``invalidate_users``) ou depois de ``CACHE_TTL_USERS`` segundos, para
+captar alterações feitas por outros processos. Com o cache compartilhado
+indisponível, vale só o TTL.
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, NamedTuple, Tuple
+
+from sgpgf import config
+from sgpgf.cache import get_query_cache
+from sgpgf.models import User
+from sgpgf.repository import get_directory_users
+
+logger = logging.getLogger("sgpgf.directory")
+
+class DirectorySnapshot(NamedTuple):
+    generation: Tuple[int, ...]
+    loaded_at: float
+    users: List[User]
+    by_cpf: Dict[str, User]
+
+class UserDirectory:
+    """Índice CPF→usuário, trocado inteiro a cada recarga."""
+
+    def __init__(self, ttl):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def _is_stale(self, snapshot, generation):
+        return (snapshot is None or snapshot.generation != generation
+                or snapshot.loaded_at + self._ttl < time.monotonic())
+
+    def snapshot(self):
+        # A geração é lida antes da carga: uma invalidação durante a consulta
+        # deixa o resultado marcado como antigo e força nova carga
+        snapshot = self._snapshot
+        try:
+            generation = get_query_cache().generations(("users",))
+        except Exception as e:
+            # Mantém a geração já carregada: a recarga passa a depender do TTL
+            logger.warning("Cache indisponível no diretório de usuários: %s", e)
+            generation = snapshot.generation if snapshot else None
+        if self._is_stale(snapshot, generation):
+            with self._lock:
+                snapshot = self._snapshot
+                if self._is_stale(snapshot, generation):
+                    users = get_directory_users()
+                    snapshot = DirectorySnapshot(generation, time.monotonic(), users,
+                                                 {user.cpf: user for user in users})
+                    self._snapshot = snapshot
+        return snapshot
+
+    def find_by_cpf(self, cpf):
+        """Usuário ativo com o CPF, ou ``None``."""
+        user = self.snapshot().by_cpf.get(cpf)
+        return user if user and user.is_active else None
+
+    def user_options(self):
+        """Rótulo ``"Nome Sobrenome (CPF)"`` → id, em ordem de nome."""
+        return {f"{user.full_name} ({user.cpf})": user.id for user in self.snapshot().users}
+
+    def clear(self):
+        with self._lock:
+            self._snapshot = None
+
+user_directory = UserDirectory(config.CACHE_TTL_USERS)
+
+def get_user_directory():
+    return user_directory
@@ -0,0 +1,5 @@
+class DataAccessError(Exception):
+    """Falha ao ler ou gravar no banco de dados."""
+
+class ConfigurationError(DataAccessError):
+    """Configuração ausente ou inválida (por exemplo, DATABASE_URL)."""
@@ -0,0 +1,105 @@
+"""Exportação em streaming de registros de peso.
+
+As linhas saem do banco em blocos direto para um arquivo, sem montar o
+resultado inteiro em memória. O download pelo app entrega o arquivo pela
+memória do Streamlit e é limitado a ``EXPORT_MAX_DOWNLOAD_MB``; períodos
+maiores são exportados pela linha de comando:
+
+    python -m sgpgf.export registros.csv.gz --start 2024-01-01 --end 2024-12-31
+"""
+import argparse
+import gzip
+from datetime import date
+
+from sgpgf import config
+from sgpgf.db import get_db_connection
+from sgpgf.metrics import instrumented
+from sgpgf.repository import build_records_filter
+
+# Formato -> (extensão, MIME)
+EXPORT_FORMATS = {
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+def build_export_query(cursor, user_id=None, start_date=None, end_date=None, typed=False):
+    # CSV sai com a data já formatada; Parquet mantém os tipos nativos
+    date_column = "wr.record_date" if typed else "to_char(wr.record_date, 'DD/MM/YYYY')"
+    weight_column = "wr.weight::float8" if typed else "wr.weight"
+    where, params = build_records_filter(user_id, start_date, end_date)
+    query = f"""
+        SELECT {date_column} AS "Data",
+               u.first_name || ' ' || u.last_name AS "Funcionário",
+               u.cpf AS "CPF", {weight_column} AS "Peso",
+               wr.work_type AS "Tipo", wr.notes AS "Obs"
+        FROM weight_records wr
+        JOIN users u ON wr.user_id = u.id WHERE 1=1 {where}
+        ORDER BY wr.record_date DESC, wr.id DESC
+    """
+    return cursor.mogrify(query, params).decode('utf-8')
+
+def export_records_csv(fileobj, user_id=None, start_date=None, end_date=None):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        query = build_export_query(cursor, user_id, start_date, end_date)
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", fileobj)
+        cursor.close()
+
+def export_records_parquet(path, user_id=None, start_date=None, end_date=None):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Exportação Parquet requer o pacote pyarrow")
+
+    schema = pa.schema([
+        ('Data', pa.date32()), ('Funcionário', pa.string()), ('CPF', pa.string()),
+        ('Peso', pa.float64()), ('Tipo', pa.string()), ('Obs', pa.string()),
+    ])
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        query = build_export_query(cursor, user_id, start_date, end_date, typed=True)
+        cursor.close()
+
+        # Cursor nomeado: o resultado fica no servidor e chega em blocos
+        cursor = conn.cursor(name="export_weight_records")
+        cursor.itersize = config.EXPORT_CHUNK_ROWS
+        cursor.execute(query)
+        with pq.ParquetWriter(path, schema) as writer:
+            while True:
+                rows = cursor.fetchmany(config.EXPORT_CHUNK_ROWS)
+                if not rows:
+                    break
+                columns = list(zip(*rows))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                    schema=schema
+                ))
+        cursor.close()
+
+@instrumented
+def export_weight_records(path, export_format, user_id=None, start_date=None, end_date=None):
+    if export_format == "Parquet":
+        export_records_parquet(path, user_id, start_date, end_date)
+    elif export_format == "CSV (gzip)":
+        with gzip.open(path, 'wb') as fileobj:
+            export_records_csv(fileobj, user_id, start_date, end_date)
+    else:
+        with open(path, 'wb') as fileobj:
+            export_records_csv(fileobj, user_id, start_date, end_date)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m sgpgf.export",
+                                     description="Exporta registros de peso para um arquivo.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="CSV (gzip)")
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--start", type=date.fromisoformat)
+    parser.add_argument("--end", type=date.fromisoformat)
+    args = parser.parse_args(argv)
+    export_weight_records(args.path, args.format, args.user_id, args.start, args.end)
+    print(args.path)
+
+if __name__ == "__main__":
+    main()
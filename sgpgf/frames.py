@@ -0,0 +1,64 @@
+"""DataFrames tipados montados a partir dos registros de ``sgpgf.models``.
+
+Cada coluna é convertida de uma vez, sem inferência linha a linha: datas em
+``datetime64``, pesos em ``float64`` (em vez de objetos ``Decimal``), tipo de
+trabalho categórico e textos em strings Arrow quando o pyarrow está
+instalado.
+"""
+from importlib.util import find_spec
+
+import pandas as pd
+
+from sgpgf.models import ProductivityRow, UserSummary, WeightRecord
+
+STRING_DTYPE = "string[pyarrow]" if find_spec("pyarrow") else "string"
+
+def columns_of(rows, fields):
+    """Colunas de uma lista de ``NamedTuple``, na ordem de ``fields``."""
+    if not rows:
+        return dict.fromkeys(fields, ())
+    return dict(zip(fields, zip(*rows)))
+
+def records_frame(records):
+    """``WeightRecord`` em colunas tipadas, com os nomes dos campos."""
+    columns = columns_of(records, WeightRecord._fields)
+    return pd.DataFrame({
+        "id": pd.Series(columns["id"], dtype="int64"),
+        "weight": pd.Series(columns["weight"], dtype="float64"),
+        "work_type": pd.Series(columns["work_type"], dtype="category"),
+        "notes": pd.Series(columns["notes"], dtype=STRING_DTYPE),
+        "record_date": pd.Series(pd.to_datetime(list(columns["record_date"])), dtype="datetime64[ns]"),
+        "first_name": pd.Series(columns["first_name"], dtype=STRING_DTYPE),
+        "last_name": pd.Series(columns["last_name"], dtype=STRING_DTYPE),
+        "cpf": pd.Series(columns["cpf"], dtype=STRING_DTYPE),
+    })
+
+def users_frame(users):
+    """``UserSummary`` em colunas tipadas, com os nomes dos campos."""
+    columns = columns_of(users, UserSummary._fields)
+    return pd.DataFrame({
+        "id": pd.Series(columns["id"], dtype="int64"),
+        "cpf": pd.Series(columns["cpf"], dtype=STRING_DTYPE),
+        "first_name": pd.Series(columns["first_name"], dtype=STRING_DTYPE),
+        "last_name": pd.Series(columns["last_name"], dtype=STRING_DTYPE),
+        "email": pd.Series(columns["email"], dtype=STRING_DTYPE),
+        "is_admin": pd.Series(columns["is_admin"], dtype="bool"),
+        "work_type": pd.Series(columns["work_type"], dtype="category"),
+        "is_active": pd.Series(columns["is_active"], dtype="bool"),
+    })
+
+def productivity_frame(rows):
+    """``ProductivityRow`` em colunas tipadas, com os nomes dos campos."""
+    columns = columns_of(rows, ProductivityRow._fields)
+    return pd.DataFrame({
+        "period_kind": pd.Series(columns["period_kind"], dtype="category"),
+        "period_start": pd.Series(pd.to_datetime(list(columns["period_start"])), dtype="datetime64[ns]"),
+        "user_id": pd.Series(columns["user_id"], dtype="int64"),
+        "first_name": pd.Series(columns["first_name"], dtype=STRING_DTYPE),
+        "last_name": pd.Series(columns["last_name"], dtype=STRING_DTYPE),
+        "work_type": pd.Series(columns["work_type"], dtype="category"),
+        "total_weight": pd.Series(columns["total_weight"], dtype="float64"),
+        "record_count": pd.Series(columns["record_count"], dtype="int64"),
+        "percentile_rank": pd.Series(columns["percentile_rank"], dtype="float64"),
+        "trend": pd.Series(columns["trend"], dtype="float64"),
+    })
@@ -0,0 +1,137 @@
+"""Importação em lote de registros de peso (balanças).
+
+Validação por linha, resolução de CPFs em uma consulta e INSERT com
+execute_values em uma única transação.
+"""
+import csv
+import hashlib
+import io
+import json
+from datetime import datetime
+
+from sgpgf import config
+from sgpgf.cache import invalidate_records
+from sgpgf.db import get_db_connection
+from sgpgf.metrics import instrumented
+from sgpgf.models import ImportResult, ImportRow
+from sgpgf.repository import insert_weight_records
+
+IMPORT_FIELDS = ('cpf', 'weight', 'work_type', 'record_date', 'notes')
+# Tamanho da coluna weight_records.import_key
+IMPORT_KEY_MAX_LENGTH = 64
+
+def parse_import_file(file_name, content):
+    """Lê um lote CSV (``,`` ``;`` ou tab) ou JSON (lista de objetos) em dicionários."""
+    text = content.decode('utf-8-sig') if isinstance(content, bytes) else content
+    if file_name.lower().endswith('.json'):
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get('records', [])
+        if not isinstance(data, list):
+            raise ValueError("JSON deve ser uma lista de registros")
+        return [row if isinstance(row, dict) else {} for row in data]
+
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    return [{(k or '').strip().lower(): v for k, v in row.items()} for row in reader]
+
+def import_first_line(file_name):
+    """Número da linha do arquivo do primeiro registro: 2 no CSV (após o cabeçalho), 1 no JSON."""
+    return 1 if file_name.lower().endswith('.json') else 2
+
+def parse_import_date(value):
+    value = str(value or '').strip()
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"data inválida: {value!r}")
+
+def validate_import_rows(rows, first_line=2):
+    """Normaliza e valida as linhas; retorna ``(válidas, erros)``.
+
+    Cada ``ImportRow`` válida recebe ``import_key``: a coluna
+    ``idempotency_key`` quando presente ou um hash do conteúdo da linha (mais
+    o número de repetições idênticas anteriores no lote). Reimportar o mesmo
+    arquivo, ou um arquivo que o estende, não duplica registros. Chaves
+    acima de ``IMPORT_KEY_MAX_LENGTH`` são recusadas. Os erros citam a linha
+    do arquivo, contada a partir de ``first_line`` (ver ``import_first_line``).
+    """
+    valid, errors = [], []
+    occurrences = {}
+    work_types = {t.lower(): t for t in config.WORK_TYPES}
+
+    for line, row in enumerate(rows[:config.IMPORT_MAX_ROWS], start=first_line):
+        try:
+            cpf = ''.join(ch for ch in str(row.get('cpf') or '') if ch.isdigit())
+            if len(cpf) != 11:
+                raise ValueError("CPF deve ter 11 dígitos")
+            weight_text = str(row.get('weight') or '').strip()
+            if ',' in weight_text and '.' not in weight_text:
+                weight_text = weight_text.replace(',', '.')
+            try:
+                weight = round(float(weight_text), 2)
+            except ValueError:
+                raise ValueError(f"peso inválido: {weight_text!r}")
+            if weight <= 0:
+                raise ValueError("peso deve ser > 0")
+            work_type = work_types.get(str(row.get('work_type') or '').strip().lower())
+            if not work_type:
+                raise ValueError(f"tipo deve ser um de: {', '.join(config.WORK_TYPES)}")
+            record_date = parse_import_date(row.get('record_date'))
+            notes = str(row.get('notes') or '').strip() or None
+        except ValueError as e:
+            errors.append((line, str(e)))
+            continue
+
+        key = str(row.get('idempotency_key') or '').strip()
+        if len(key) > IMPORT_KEY_MAX_LENGTH:
+            errors.append((line, f"idempotency_key deve ter no máximo {IMPORT_KEY_MAX_LENGTH} caracteres"))
+            continue
+        if not key:
+            content = f"{cpf}|{weight:.2f}|{work_type}|{record_date.isoformat()}|{notes or ''}"
+            occurrence = occurrences.get(content, 0)
+            occurrences[content] = occurrence + 1
+            key = hashlib.sha256(f"{content}|{occurrence}".encode('utf-8')).hexdigest()
+        valid.append(ImportRow(line, cpf, weight, work_type, record_date, notes, key))
+
+    if len(rows) > config.IMPORT_MAX_ROWS:
+        errors.append((config.IMPORT_MAX_ROWS + first_line,
+                       f"lote excede {config.IMPORT_MAX_ROWS} linhas; restante ignorado"))
+    return valid, errors
+
+@instrumented
+def ingest_weight_records(rows, first_line=2):
+    """Valida e insere um lote; retorna um ``ImportResult``."""
+    valid, errors = validate_import_rows(rows, first_line)
+    values, inserted = [], []
+
+    if valid:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT cpf, id FROM users WHERE cpf = ANY(%s) AND is_active = true
+            """, (list({row.cpf for row in valid}),))
+            user_ids = dict(cursor.fetchall())
+
+            for row in valid:
+                user_id = user_ids.get(row.cpf)
+                if user_id is None:
+                    errors.append((row.line, f"CPF não encontrado: {row.cpf}"))
+                    continue
+                values.append((user_id, row.weight, row.work_type, row.notes,
+                               row.record_date, row.import_key))
+
+            if values:
+                inserted = insert_weight_records(cursor, values)
+            conn.commit()
+            cursor.close()
+
+        if inserted:
+            invalidate_records(*{user_id for _, user_id in inserted})
+
+    return ImportResult(len(inserted), len(values) - len(inserted), sorted(errors))
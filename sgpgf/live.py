@@ -0,0 +1,194 @@
+"""Indicadores e últimos registros ao vivo do dashboard admin.
+
+Cada escrita em weight_records emite um NOTIFY com o intervalo de ids
+gravados (``repository.notify_weight_records``). Uma thread por processo
+escuta o canal em uma conexão própria, busca só os registros novos e os soma
+às somas lidas uma vez por ``get_live_baseline``; o dashboard lê o resultado
+da memória, sem consultar o banco a cada atualização.
+
+Registros com id menor que o da base que só fazem commit depois dela (duas
+transações concorrentes) ficam de fora até o próximo recálculo completo, a
+cada ``LIVE_RESYNC_SECONDS``.
+"""
+import logging
+import select
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from sgpgf import config, repository
+from sgpgf.cache import get_query_cache, invalidate_records
+from sgpgf.models import DailyStats, LiveSnapshot
+
+logger = logging.getLogger("sgpgf.live")
+
+# Registros buscados por consulta ao processar notificações
+FETCH_ROWS = 1000
+# Espera máxima por notificações antes de checar se é hora de recalcular
+POLL_SECONDS = 5
+
+def parse_payload(payload):
+    """Intervalo ``(menor, maior)`` de ids de uma notificação; None se ilegível."""
+    try:
+        low, high = payload.split(":")
+        return int(low), int(high)
+    except ValueError:
+        return None
+
+class LiveFeed:
+    """Indicadores do dia e últimos registros mantidos por incrementos."""
+
+    def __init__(self, feed_size=config.LIVE_FEED_SIZE):
+        self._lock = threading.Lock()
+        self._feed_size = feed_size
+        self._snapshot = None
+        self._synced_at = None
+        self._users_generation = None
+
+    def snapshot(self):
+        """Último ``LiveSnapshot``; None antes da primeira sincronização ou sem conexão."""
+        with self._lock:
+            return self._snapshot
+
+    def resync(self):
+        """Recarrega as somas e os últimos registros do banco."""
+        # Lida antes da base: uma invalidação durante a consulta força outro recálculo
+        users_generation = self.users_generation()
+        baseline = repository.get_live_baseline()
+        records = repository.get_latest_records(self._feed_size, baseline.last_id)
+        with self._lock:
+            self._day = baseline.day
+            self._last_id = baseline.last_id
+            self._seen = set()
+            self._active = set(baseline.active_user_ids)
+            self._today_weight = baseline.today_weight
+            self._monthly_weight = baseline.monthly_weight
+            self._week_weight = baseline.week_weight
+            self._week_count = baseline.week_count
+            self._total_users = baseline.total_users
+            self._recent = deque(records, maxlen=self._feed_size)
+            self._base_id = baseline.last_id
+            self._publish()
+        self._synced_at = time.monotonic()
+        self._users_generation = users_generation
+
+    def users_generation(self):
+        # Cache compartilhado indisponível: o total de usuários fica para o recálculo periódico
+        try:
+            return get_query_cache().generations(("users",))
+        except Exception as e:
+            logger.warning("Cache indisponível ao verificar usuários: %s", e)
+            return self._users_generation
+
+    def resync_due(self, today):
+        """Hora de recalcular: intervalo vencido, virada do dia no banco ou usuários alterados."""
+        return (time.monotonic() - self._synced_at >= config.LIVE_RESYNC_SECONDS
+                or today != self._day
+                or self.users_generation() != self._users_generation)
+
+    def apply(self, payloads):
+        """Busca e soma os registros das notificações e os de id maior que o último visto."""
+        ranges = [(max(low, self._base_id + 1), high)
+                  for low, high in filter(None, map(parse_payload, payloads))
+                  if high > self._base_id]
+        ranges.append((self._last_id + 1, None))
+        user_ids = set()
+
+        while ranges:
+            rows = repository.get_records_by_id_ranges(ranges, FETCH_ROWS)
+            with self._lock:
+                for record, user_id in rows:
+                    self._merge(record, user_id)
+                    user_ids.add(user_id)
+                self._publish()
+            if len(rows) < FETCH_ROWS:
+                break
+            last = rows[-1][0].id
+            ranges = [(max(low, last + 1), high) for low, high in ranges
+                      if high is None or high > last]
+
+        # Com cache em memória, escritas de outros processos (importações,
+        # fila de gravação) só chegam a este processo pela notificação
+        if user_ids and config.CACHE_BACKEND == "memory":
+            invalidate_records(*user_ids)
+
+    def _merge(self, record, user_id):
+        if record.id in self._seen:
+            return
+        self._seen.add(record.id)
+        self._last_id = max(self._last_id, record.id)
+
+        weight = float(record.weight)
+        month_start = self._day.replace(day=1)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        if record.record_date == self._day:
+            self._today_weight += weight
+            self._active.add(user_id)
+        if month_start <= record.record_date < next_month:
+            self._monthly_weight += weight
+        if record.record_date >= self._day - timedelta(days=7):
+            self._week_weight += weight
+            self._week_count += 1
+        self._recent.appendleft(record)
+
+    def _publish(self):
+        weekly_average = self._week_weight / self._week_count if self._week_count else 0.0
+        stats = DailyStats(len(self._active), self._today_weight, self._monthly_weight,
+                           weekly_average, self._total_users)
+        self._snapshot = LiveSnapshot(stats, list(self._recent), datetime.now())
+
+    def run(self):
+        delay = 1
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(config.database_url())
+                conn.autocommit = True
+                cursor = conn.cursor()
+                # Escuta antes de ler a base para não perder escritas entre as duas etapas
+                cursor.execute(f"LISTEN {repository.RECORDS_CHANNEL}")
+                cursor.close()
+                self.resync()
+                delay = 1
+                while True:
+                    # Notificações lidas junto com o SELECT abaixo já estão em
+                    # conn.notifies e não acordam o select
+                    if not conn.notifies and select.select([conn], [], [], POLL_SECONDS) != ([], [], []):
+                        conn.poll()
+                    payloads = [notify.payload for notify in conn.notifies]
+                    conn.notifies.clear()
+                    if payloads:
+                        self.apply(payloads)
+                    # O dia vem do banco, no fuso dele, como o da base
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT CURRENT_DATE")
+                    today = cursor.fetchone()[0]
+                    cursor.close()
+                    if self.resync_due(today):
+                        self.resync()
+            except Exception as e:
+                with self._lock:
+                    self._snapshot = None
+                logger.warning("Falha no listener ao vivo (nova tentativa em %.0fs): %s", delay, e)
+                time.sleep(delay)
+                delay = min(delay * 2, config.LIVE_MAX_BACKOFF)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+live_feed = None
+live_feed_lock = threading.Lock()
+
+def start_live_feed():
+    """Inicia o listener do processo; com ``LIVE_REFRESH_SECONDS`` 0 não faz nada."""
+    global live_feed
+    if config.LIVE_REFRESH_SECONDS <= 0:
+        return None
+    with live_feed_lock:
+        if live_feed is None:
+            live_feed = LiveFeed()
+            threading.Thread(target=live_feed.run, name="live-feed", daemon=True).start()
+        return live_feed
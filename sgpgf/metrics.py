@@ -0,0 +1,262 @@
+"""Instrumentação: tempo por função e por comando SQL, linhas retornadas,
+espera por conexão do pool e log de consultas lentas com EXPLAIN."""
+import functools
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psycopg2
+from psycopg2 import extensions as pg_extensions
+from psycopg2 import sql as pg_sql
+
+from sgpgf import config
+
+query_logger = logging.getLogger("sgpgf.queries")
+logger = logging.getLogger("sgpgf.metrics")
+
+class QueryMetrics:
+    """Agregados de tempo por processo, expostos no painel de diagnóstico e em /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.functions = {}
+            self.statements = {}
+            self.pool_wait = {'count': 0, 'total': 0.0, 'max': 0.0}
+            self.cache = {'hits': 0, 'misses': 0}
+            self.slow_queries = deque(maxlen=config.METRICS_SLOW_QUERIES_KEPT)
+
+    def _add(self, table, key, elapsed, rows=0, error=False):
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = {'calls': 0, 'errors': 0, 'rows': 0, 'total': 0.0, 'max': 0.0}
+        entry['calls'] += 1
+        entry['errors'] += int(error)
+        entry['rows'] += rows
+        entry['total'] += elapsed
+        entry['max'] = max(entry['max'], elapsed)
+
+    def record_function(self, name, elapsed, error=False):
+        with self._lock:
+            self._add(self.functions, name, elapsed, error=error)
+
+    def record_statement(self, statement, elapsed, rows, error=False):
+        with self._lock:
+            if statement not in self.statements and len(self.statements) >= config.METRICS_MAX_STATEMENTS:
+                statement = "(outros)"
+            self._add(self.statements, statement, elapsed, rows, error)
+
+    def record_pool_wait(self, elapsed):
+        with self._lock:
+            self.pool_wait['count'] += 1
+            self.pool_wait['total'] += elapsed
+            self.pool_wait['max'] = max(self.pool_wait['max'], elapsed)
+
+    def record_cache(self, hit):
+        with self._lock:
+            self.cache['hits' if hit else 'misses'] += 1
+
+    def record_slow_query(self, statement, elapsed, plan):
+        with self._lock:
+            self.slow_queries.appendleft({
+                'at': datetime.now(), 'ms': elapsed * 1000, 'statement': statement, 'plan': plan
+            })
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'functions': {k: dict(v) for k, v in self.functions.items()},
+                'statements': {k: dict(v) for k, v in self.statements.items()},
+                'pool_wait': dict(self.pool_wait),
+                'cache': dict(self.cache),
+                'slow_queries': list(self.slow_queries),
+            }
+
+    def prometheus_text(self):
+        def label(value):
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+        data = self.snapshot()
+        lines = []
+        for kind, key, entries in (('function', 'function', data['functions']),
+                                   ('sql', 'statement', data['statements'])):
+            for metric, field, help_text in (
+                    ('calls_total', 'calls', 'Chamadas'),
+                    ('errors_total', 'errors', 'Chamadas com erro'),
+                    ('seconds_total', 'total', 'Tempo total (s)'),
+                    ('rows_total', 'rows', 'Linhas retornadas')):
+                if kind == 'function' and field == 'rows':
+                    continue
+                name = f"sgpgf_{kind}_{metric}"
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for entry_key, entry in sorted(entries.items()):
+                    lines.append(f'{name}{{{key}="{label(entry_key)}"}} {entry[field]}')
+        lines += [
+            "# HELP sgpgf_pool_checkouts_total Conexões emprestadas do pool",
+            "# TYPE sgpgf_pool_checkouts_total counter",
+            f"sgpgf_pool_checkouts_total {data['pool_wait']['count']}",
+            "# HELP sgpgf_pool_wait_seconds_total Tempo total aguardando conexão (s)",
+            "# TYPE sgpgf_pool_wait_seconds_total counter",
+            f"sgpgf_pool_wait_seconds_total {data['pool_wait']['total']}",
+            "# HELP sgpgf_cache_requests_total Consultas atendidas pelo cache",
+            "# TYPE sgpgf_cache_requests_total counter",
+            f'sgpgf_cache_requests_total{{result="hit"}} {data["cache"]["hits"]}',
+            f'sgpgf_cache_requests_total{{result="miss"}} {data["cache"]["misses"]}',
+        ]
+        return "\n".join(lines) + "\n"
+
+query_metrics = QueryMetrics()
+
+def get_query_metrics():
+    return query_metrics
+
+def statement_label(query):
+    # Agrupa comandos iguais com valores diferentes (literais, listas de VALUES)
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    label = re.sub(r"'(?:[^']|'')*'", "?", str(query))
+    label = re.sub(r"\b\d+(?:\.\d+)?\b", "?", label)
+    label = re.sub(r"\s+", " ", label).strip()
+    label = re.sub(r"(\([^()]*\))(?:, \([^()]*\))+", r"\1, ...", label)
+    return label[:200]
+
+# Remove literais de texto (CPFs, hashes de senha, observações) de comandos
+# que já chegam com os valores embutidos, como os de execute_values
+def redact_statement(query):
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return re.sub(r"'(?:[^']|'')*'", "'?'", query)
+
+def explain_statement(cursor, query, vars=None):
+    # EXPLAIN (sem ANALYZE) dentro de um savepoint, para não abortar a
+    # transação de quem executou a consulta. Os valores entram só no EXPLAIN;
+    # o plano devolvido tem os literais de texto removidos
+    conn = cursor.connection
+    statement = cursor.mogrify(query, vars) if vars is not None else query
+    if isinstance(statement, bytes):
+        statement = statement.decode('utf-8', 'replace')
+    first_word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    if (first_word not in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE") or conn.autocommit
+            or conn.get_transaction_status() != pg_extensions.TRANSACTION_STATUS_INTRANS):
+        return ""
+    explain = conn.cursor(cursor_factory=pg_extensions.cursor)
+    try:
+        explain.execute("SAVEPOINT slow_query_explain")
+        try:
+            explain.execute("EXPLAIN " + statement)
+            plan = redact_statement("\n".join(row[0] for row in explain.fetchall()))
+            explain.execute("RELEASE SAVEPOINT slow_query_explain")
+        except psycopg2.Error as e:
+            explain.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            plan = f"(EXPLAIN falhou: {str(e).strip()})"
+        return plan
+    finally:
+        explain.close()
+
+class InstrumentedCursor(pg_extensions.cursor):
+    """Cursor que mede cada comando e registra consultas acima de SLOW_QUERY_MS."""
+
+    def _record(self, query, vars, started, error):
+        elapsed = time.perf_counter() - started
+        # A instrumentação roda depois do comando: uma falha aqui não pode
+        # derrubar uma consulta que já deu certo
+        try:
+            if isinstance(query, pg_sql.Composable):
+                query = query.as_string(self)
+            rows = max(self.rowcount, 0) if not error else 0
+            query_metrics.record_statement(statement_label(query), elapsed, rows, error)
+            if not error and not self.name and elapsed * 1000 >= config.SLOW_QUERY_MS:
+                # Log e painel recebem o comando parametrizado, sem os valores
+                statement = redact_statement(query)
+                plan = explain_statement(self, query, vars)
+                query_logger.warning("Consulta lenta (%.0f ms): %s\n%s", elapsed * 1000, statement, plan)
+                query_metrics.record_slow_query(statement, elapsed, plan)
+        except Exception as e:
+            query_logger.error("Falha ao registrar métricas do comando: %s", e)
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception:
+            self._record(query, vars, started, error=True)
+            raise
+        self._record(query, vars, started, error=False)
+        return result
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            result = super().copy_expert(sql, file, size)
+        except Exception:
+            self._record(sql, None, started, error=True)
+            raise
+        self._record(sql, None, started, error=False)
+        return result
+
+def instrumented(func):
+    """Registra o tempo de parede de cada chamada da função em QueryMetrics."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        error = False
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            query_metrics.record_function(func.__name__, time.perf_counter() - started, error)
+    return wrapper
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = query_metrics.prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+metrics_server = None
+metrics_server_failed = False
+metrics_server_lock = threading.Lock()
+
+def start_metrics_server(port=None, host=None):
+    """Expõe as métricas no formato de texto do Prometheus em http://<host>:<porta>/metrics.
+
+    Sem porta (argumento ou METRICS_PORT) não faz nada; chamadas repetidas
+    reutilizam o servidor já iniciado. O endpoint não tem autenticação e
+    escuta em ``METRICS_HOST`` (127.0.0.1 por padrão). Se a porta estiver
+    ocupada, a falha é registrada uma vez e o processo segue sem o endpoint.
+    """
+    global metrics_server, metrics_server_failed
+    port = port or config.METRICS_PORT
+    host = host or config.METRICS_HOST
+    if not port:
+        return None
+    with metrics_server_lock:
+        if metrics_server is None and not metrics_server_failed:
+            try:
+                metrics_server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+            except OSError as e:
+                metrics_server_failed = True
+                logger.error("Endpoint de métricas indisponível em %s:%s: %s", host, port, e)
+                return None
+            threading.Thread(target=metrics_server.serve_forever, name="metrics-server",
+                             daemon=True).start()
+        return metrics_server
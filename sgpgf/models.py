@@ -0,0 +1,160 @@
+"""Registros tipados devolvidos pela camada de dados.
+
+São ``NamedTuple``: imutáveis, compactos (sem ``__dict__``) e seguros para
+compartilhar entre sessões pelo cache de consultas.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List, NamedTuple, Optional, Tuple
+
+class User(NamedTuple):
+    id: int
+    cpf: str
+    password: Optional[str]
+    first_name: str
+    last_name: str
+    email: Optional[str]
+    profile_image_url: Optional[str]
+    is_admin: bool
+    work_type: str
+    is_active: bool
+
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+class UserSummary(NamedTuple):
+    id: int
+    cpf: str
+    first_name: str
+    last_name: str
+    email: Optional[str]
+    is_admin: bool
+    work_type: str
+    is_active: bool
+
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+class WeightRecord(NamedTuple):
+    id: int
+    weight: Decimal
+    work_type: str
+    notes: Optional[str]
+    record_date: date
+    first_name: str
+    last_name: str
+    cpf: str
+
+    @property
+    def page_key(self):
+        return (self.record_date, self.id)
+
+class WeightPoint(NamedTuple):
+    record_date: date
+    weight: Decimal
+
+class SeriesPoint(NamedTuple):
+    # Início do período (dia, semana ou mês)
+    bucket: date
+    weight: float
+    records: int
+    work_type: Optional[str] = None
+
+class UserStats(NamedTuple):
+    today_weight: float
+    monthly_weight: float
+    weekly_average: float
+
+class DailyWeight(NamedTuple):
+    record_date: date
+    weight: float
+    records: int
+
+class WeightSummary(NamedTuple):
+    stats: UserStats
+    # Totais por dia dos últimos USER_SUMMARY_DAYS dias, em ordem de data
+    recent_days: List[DailyWeight]
+
+class DailyStats(NamedTuple):
+    active_users: int
+    today_weight: float
+    monthly_weight: float
+    weekly_average: float
+    total_users: int
+
+class LiveBaseline(NamedTuple):
+    day: date
+    # Maior id visível no mesmo snapshot das somas
+    last_id: int
+    active_user_ids: List[int]
+    today_weight: float
+    monthly_weight: float
+    week_weight: float
+    week_count: int
+    total_users: int
+
+class LiveSnapshot(NamedTuple):
+    stats: DailyStats
+    # Mais novos primeiro
+    records: List[WeightRecord]
+    updated_at: datetime
+
+class RecordsPage(NamedTuple):
+    records: List[WeightRecord]
+    # (record_date, id) do último registro; None na última página
+    next_key: Optional[Tuple[date, int]]
+
+class ReportRollups(NamedTuple):
+    by_type: List[Tuple[str, float]]
+    top_users: List[Tuple[str, float]]
+
+class ImportRow(NamedTuple):
+    line: int
+    cpf: str
+    weight: float
+    work_type: str
+    record_date: date
+    notes: Optional[str]
+    import_key: str
+
+class ImportResult(NamedTuple):
+    inserted: int
+    duplicates: int
+    errors: List[Tuple[int, str]]
+
+class QueuedRecord(NamedTuple):
+    import_key: str
+    weight: float
+    work_type: str
+    notes: Optional[str]
+    record_date: date
+    status: str
+    attempts: int
+    last_error: Optional[str]
+    created_at: datetime
+
+class ProductivityRow(NamedTuple):
+    # day, week ou month
+    period_kind: str
+    period_start: date
+    user_id: int
+    first_name: str
+    last_name: str
+    work_type: str
+    total_weight: Decimal
+    record_count: int
+    # Posição entre os funcionários do mesmo tipo e período (0 a 1)
+    percentile_rank: float
+    # Variação relativa ao período anterior; None sem período anterior
+    trend: Optional[float]
+
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+EMPTY_USER_STATS = UserStats(0.0, 0.0, 0.0)
+EMPTY_WEIGHT_SUMMARY = WeightSummary(EMPTY_USER_STATS, [])
+EMPTY_DAILY_STATS = DailyStats(0, 0.0, 0.0, 0.0, 0)
+EMPTY_REPORT = ReportRollups([], [])
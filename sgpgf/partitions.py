@@ -0,0 +1,144 @@
+"""Partições mensais de weight_records e arquivamento das antigas.
+
+Cada mês fica em uma partição ``weight_records_pAAAAMM`` (migração 6);
+datas sem partição caem em ``weight_records_default`` até a partição do
+mês ser criada. Partições mais antigas que ``ARCHIVE_AFTER_MONTHS`` podem
+ser desanexadas, gravadas em ``ARCHIVE_DIR`` como CSV gzip e removidas.
+Os agregados (weight_daily_rollup, user_weight_summary) são mantidos, então
+relatórios continuam cobrindo os meses arquivados.
+
+Uso (cron):
+    python -m sgpgf.partitions ensure
+    python -m sgpgf.partitions archive --older-than-months 24
+    python -m sgpgf.partitions list
+"""
+import argparse
+import gzip
+import logging
+import os
+import re
+from datetime import date
+
+from psycopg2 import sql
+
+from sgpgf import config
+from sgpgf.db import get_db_connection
+
+logger = logging.getLogger("sgpgf.partitions")
+
+PARTITION_NAME = re.compile(r"^weight_records_p(\d{4})(\d{2})$")
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+# Chave do advisory lock que serializa a criação de partições entre processos
+PARTITIONS_LOCK = 7243004
+
+def ensure_partitions(conn, first_month=None, months_ahead=config.PARTITION_MONTHS_AHEAD):
+    """Cria as partições de ``first_month`` (padrão: mês atual) até ``months_ahead`` meses à frente."""
+    cursor = conn.cursor()
+    # Sem o lock, dois workers iniciando juntos criariam a mesma partição
+    # e um deles falharia com "relation already exists"
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (PARTITIONS_LOCK,))
+    cursor.execute("""
+        SELECT ensure_weight_records_partitions(
+            COALESCE(%s, CURRENT_DATE),
+            (date_trunc('month', CURRENT_DATE) + make_interval(months => %s))::date
+        )
+    """, (first_month, months_ahead))
+    created = cursor.fetchone()[0]
+    conn.commit()
+    cursor.close()
+    return created
+
+def list_partitions(conn):
+    """Partições mensais anexadas, como ``(nome, mês, linhas estimadas)`` em ordem de mês."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT c.relname, c.reltuples::bigint
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'weight_records'::regclass
+    """)
+    partitions = []
+    for name, rows in cursor.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1), max(rows, 0)))
+    cursor.close()
+    return sorted(partitions, key=lambda partition: partition[1])
+
+def archive_partition(conn, name, archive_dir):
+    """Grava a partição em ``<archive_dir>/<nome>.csv.gz``, desanexa e remove.
+
+    Tudo em uma transação: se a gravação do arquivo falhar, a partição
+    continua anexada. Durante a cópia só escritas nessa partição esperam;
+    o lock exclusivo em weight_records dura apenas o DETACH e o DROP.
+    """
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    partial_path = path + ".partial"
+    table = sql.Identifier(name)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql.SQL("LOCK TABLE {} IN EXCLUSIVE MODE").format(table).as_string(conn))
+        with open(partial_path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as fileobj:
+                cursor.copy_expert(sql.SQL(
+                    "COPY (SELECT * FROM {} ORDER BY record_date, id) TO STDOUT WITH (FORMAT csv, HEADER)"
+                ).format(table).as_string(conn), fileobj)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(partial_path, path)
+        cursor.execute(sql.SQL("ALTER TABLE weight_records DETACH PARTITION {}").format(table).as_string(conn))
+        cursor.execute(sql.SQL("DROP TABLE {}").format(table).as_string(conn))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    finally:
+        cursor.close()
+    return path
+
+def archive_partitions(older_than_months=config.ARCHIVE_AFTER_MONTHS, archive_dir=config.ARCHIVE_DIR):
+    """Arquiva as partições de meses anteriores a ``older_than_months`` meses atrás; retorna os arquivos."""
+    cutoff = add_months(date.today().replace(day=1), -older_than_months)
+    os.makedirs(archive_dir, exist_ok=True)
+    archived = []
+    with get_db_connection() as conn:
+        for name, month, _ in list_partitions(conn):
+            if month >= cutoff:
+                break
+            path = archive_partition(conn, name, archive_dir)
+            logger.info("Partição %s arquivada em %s", name, path)
+            archived.append(path)
+    return archived
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m sgpgf.partitions",
+                                     description="Partições mensais de weight_records.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ensure = commands.add_parser("ensure", help="cria as partições dos próximos meses")
+    ensure.add_argument("--months-ahead", type=int, default=config.PARTITION_MONTHS_AHEAD)
+    archive = commands.add_parser("archive", help="arquiva e remove partições antigas")
+    archive.add_argument("--older-than-months", type=int, default=config.ARCHIVE_AFTER_MONTHS)
+    archive.add_argument("--archive-dir", default=config.ARCHIVE_DIR)
+    commands.add_parser("list", help="lista as partições mensais")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.command == "ensure":
+        with get_db_connection() as conn:
+            print(f"{ensure_partitions(conn, months_ahead=args.months_ahead)} partições criadas")
+    elif args.command == "archive":
+        for path in archive_partitions(args.older_than_months, args.archive_dir):
+            print(path)
+    else:
+        with get_db_connection() as conn:
+            for name, month, rows in list_partitions(conn):
+                print(f"{name}\t{month:%m/%Y}\t~{rows} linhas")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+"""Consultas e escritas de usuários e registros de peso.
+
+Leituras passam pelo cache de consultas e devolvem registros de
+``sgpgf.models``; escritas invalidam as etiquetas afetadas. Nenhuma função
+trata erros: falhas de banco sobem como ``DataAccessError``.
+"""
+from datetime import date, timedelta
+
+from psycopg2 import extras as pg_extras
+
+from sgpgf import config
+from sgpgf.cache import cached_query, invalidate_records, invalidate_users, records_cache_tags, user_records_tag
+from sgpgf.db import get_db_connection
+from sgpgf.metrics import instrumented
+from sgpgf.models import (EMPTY_WEIGHT_SUMMARY, DailyStats, DailyWeight, LiveBaseline, RecordsPage,
+                          ReportRollups, SeriesPoint, User, UserStats, UserSummary, WeightPoint,
+                          WeightRecord, WeightSummary)
+from sgpgf.security import hash_password
+from sgpgf.series import downsample_points
+
+@instrumented
+def get_directory_users():
+    """Todos os usuários, com hash de senha, para o diretório em memória (``sgpgf.directory``)."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, cpf, password, first_name, last_name, email,
+                   profile_image_url, is_admin, work_type, is_active
+            FROM users ORDER BY first_name, last_name
+        """)
+        results = [User._make(row) for row in cursor.fetchall()]
+        cursor.close()
+    return results
+
+@instrumented
+def create_user(cpf, password, first_name, last_name, email, is_admin, work_type):
+    hashed_password = hash_password(password) if password else ""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO users (cpf, password, first_name, last_name, email, is_admin, work_type)
+            VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id
+        """, (cpf, hashed_password, first_name, last_name, email, is_admin, work_type))
+        user_id = cursor.fetchone()[0]
+        conn.commit()
+        cursor.close()
+    invalidate_users()
+    return user_id
+
+@instrumented
+def update_password_hash(user_id, hashed):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE users SET password = %s WHERE id = %s", (hashed, user_id))
+        conn.commit()
+        cursor.close()
+    invalidate_users()
+
+# Canal do NOTIFY emitido a cada escrita de registros (escutado por sgpgf.live)
+RECORDS_CHANNEL = "weight_records"
+
+def notify_weight_records(cursor, record_ids):
+    """Avisa o intervalo ``menor:maior`` dos ids gravados; o PostgreSQL só entrega no commit."""
+    if record_ids:
+        cursor.execute("SELECT pg_notify(%s, %s)",
+                       (RECORDS_CHANNEL, f"{min(record_ids)}:{max(record_ids)}"))
+
+# Soma os registros recém-inseridos ao agregado diário, na mesma transação
+# do INSERT, para que relatórios nunca vejam um agregado divergente. As
+# datas restringem a busca às partições dos meses afetados.
+def apply_daily_rollup(cursor, record_ids, record_dates):
+    cursor.execute("""
+        INSERT INTO weight_daily_rollup (record_date, user_id, work_type, total_weight, record_count)
+        SELECT record_date, user_id, work_type, SUM(weight), COUNT(*)
+        FROM weight_records
+        WHERE id = ANY(%s) AND record_date = ANY(%s) AND user_id IS NOT NULL
+        GROUP BY record_date, user_id, work_type
+        ON CONFLICT (record_date, user_id, work_type) DO UPDATE SET
+            total_weight = weight_daily_rollup.total_weight + EXCLUDED.total_weight,
+            record_count = weight_daily_rollup.record_count + EXCLUDED.record_count,
+            updated_at = CURRENT_TIMESTAMP
+    """, (list(record_ids), sorted(set(record_dates))))
+
+def insert_weight_records(cursor, values):
+    """Insere ``(user_id, weight, work_type, notes, record_date, import_key)`` em lote.
+
+    Linhas cuja ``(import_key, record_date)`` já existe são ignoradas, o que
+    torna o reenvio de um lote idempotente. Retorna ``(id, user_id)`` das linhas inseridas;
+    o commit fica a cargo de quem chama.
+    """
+    inserted = pg_extras.execute_values(cursor, """
+        INSERT INTO weight_records (user_id, weight, work_type, notes, record_date, import_key)
+        VALUES %s
+        ON CONFLICT (import_key, record_date) DO NOTHING
+        RETURNING id, user_id, record_date
+    """, values, page_size=1000, fetch=True)
+    apply_daily_rollup(cursor, [row[0] for row in inserted], [row[2] for row in inserted])
+    refresh_user_summaries(cursor, [row[1] for row in inserted])
+    notify_weight_records(cursor, [row[0] for row in inserted])
+    return [(record_id, user_id) for record_id, user_id, _ in inserted]
+
+# Chave dos advisory locks que serializam a atualização do resumo de um usuário
+USER_SUMMARY_LOCK = 7243002
+
+def refresh_user_summaries(cursor, user_ids):
+    """Recalcula user_weight_summary dos usuários a partir de weight_daily_rollup.
+
+    Deve rodar depois de ``apply_daily_rollup``, na mesma transação. Lê no
+    máximo ``USER_SUMMARY_DAYS`` dias por usuário, então o custo não cresce
+    com o histórico.
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    # Sem o lock, duas escritas simultâneas do mesmo usuário poderiam gravar
+    # um resumo calculado sem a outra
+    cursor.execute("SELECT pg_advisory_xact_lock(%s, user_id) FROM unnest(%s::int[]) AS ids(user_id)",
+                   (USER_SUMMARY_LOCK, user_ids))
+    cursor.execute("""
+        WITH days AS (
+            SELECT user_id, record_date, SUM(total_weight) AS weight, SUM(record_count) AS records
+            FROM weight_daily_rollup
+            WHERE user_id = ANY(%(user_ids)s) AND record_date >= CURRENT_DATE - %(days)s
+            GROUP BY user_id, record_date
+        )
+        INSERT INTO user_weight_summary (user_id, as_of, today_weight, month_weight, week_weight,
+                                         week_count, recent_days, updated_at)
+        SELECT ids.user_id, CURRENT_DATE,
+               COALESCE(SUM(d.weight) FILTER (WHERE d.record_date = CURRENT_DATE), 0),
+               COALESCE(SUM(d.weight) FILTER (
+                   WHERE d.record_date >= DATE_TRUNC('month', CURRENT_DATE)::date
+                     AND d.record_date < (DATE_TRUNC('month', CURRENT_DATE) + INTERVAL '1 month')::date
+               ), 0),
+               COALESCE(SUM(d.weight) FILTER (WHERE d.record_date >= CURRENT_DATE - 7), 0),
+               COALESCE(SUM(d.records) FILTER (WHERE d.record_date >= CURRENT_DATE - 7), 0),
+               COALESCE(jsonb_object_agg(to_char(d.record_date, 'YYYY-MM-DD'),
+                                         jsonb_build_array(d.weight, d.records))
+                        FILTER (WHERE d.record_date IS NOT NULL), '{}'),
+               CURRENT_TIMESTAMP
+        FROM unnest(%(user_ids)s::int[]) AS ids(user_id)
+        LEFT JOIN days d ON d.user_id = ids.user_id
+        GROUP BY ids.user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            as_of = EXCLUDED.as_of,
+            today_weight = EXCLUDED.today_weight,
+            month_weight = EXCLUDED.month_weight,
+            week_weight = EXCLUDED.week_weight,
+            week_count = EXCLUDED.week_count,
+            recent_days = EXCLUDED.recent_days,
+            updated_at = EXCLUDED.updated_at
+    """, {'user_ids': user_ids, 'days': config.USER_SUMMARY_DAYS - 1})
+
+@instrumented
+def create_weight_record(user_id, weight, work_type, notes, record_date):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO weight_records (user_id, weight, work_type, notes, record_date)
+            VALUES (%s, %s, %s, %s, %s) RETURNING id
+        """, (user_id, weight, work_type, notes, record_date))
+        record_id = cursor.fetchone()[0]
+        apply_daily_rollup(cursor, [record_id], [record_date])
+        refresh_user_summaries(cursor, [user_id])
+        notify_weight_records(cursor, [record_id])
+        conn.commit()
+        cursor.close()
+    invalidate_records(user_id)
+    return record_id
+
+@cached_query(ttl=config.CACHE_TTL_STATS, tags=lambda user_id: (user_records_tag(user_id),))
+@instrumented
+def get_weight_summary(user_id):
+    """Estatísticas e totais diários recentes do funcionário, lidos por chave primária.
+
+    Os contadores valem para o dia ``as_of`` da última escrita; se o dia
+    virou desde então, são recalculados a partir de ``recent_days``.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT as_of, CURRENT_DATE, today_weight, month_weight, week_weight, week_count, recent_days
+            FROM user_weight_summary WHERE user_id = %s
+        """, (user_id,))
+        row = cursor.fetchone()
+        cursor.close()
+
+    if row is None:
+        return EMPTY_WEIGHT_SUMMARY
+    as_of, today, today_weight, month_weight, week_weight, week_count, recent_days = row
+    days = sorted(DailyWeight(date.fromisoformat(day), float(weight), int(records))
+                  for day, (weight, records) in recent_days.items())
+
+    if as_of != today:
+        month_start = today.replace(day=1)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        week_start = today - timedelta(days=7)
+        today_weight = sum(day.weight for day in days if day.record_date == today)
+        month_weight = sum(day.weight for day in days if month_start <= day.record_date < next_month)
+        week_weight = sum(day.weight for day in days if day.record_date >= week_start)
+        week_count = sum(day.records for day in days if day.record_date >= week_start)
+
+    weekly_average = float(week_weight) / week_count if week_count else 0.0
+    stats = UserStats(float(today_weight), float(month_weight), weekly_average)
+    return WeightSummary(stats, [day for day in days if day.record_date <= today])
+
+RECORDS_SELECT = """
+    SELECT wr.id, wr.weight, wr.work_type, wr.notes, wr.record_date,
+           u.first_name, u.last_name, u.cpf
+    FROM weight_records wr
+    JOIN users u ON wr.user_id = u.id WHERE 1=1
+"""
+
+def build_records_filter(user_id=None, start_date=None, end_date=None):
+    query = ""
+    params = []
+
+    if user_id:
+        query += " AND wr.user_id = %s"
+        params.append(user_id)
+    if start_date:
+        query += " AND wr.record_date >= %s"
+        params.append(start_date)
+    if end_date:
+        query += " AND wr.record_date <= %s"
+        params.append(end_date)
+
+    return query, params
+
+@cached_query(ttl=config.CACHE_TTL_RECORDS, tags=records_cache_tags)
+@instrumented
+def get_weight_records_page(user_id=None, start_date=None, end_date=None,
+                            after=None, page_size=config.RECORDS_PAGE_SIZE):
+    """Uma página de registros em ordem (record_date, id) decrescente.
+
+    ``after`` é a chave ``(record_date, id)`` do último registro da página
+    anterior (paginação por keyset, sem OFFSET); ``next_key`` do resultado
+    é ``None`` na última página.
+    """
+    where, params = build_records_filter(user_id, start_date, end_date)
+    if after:
+        where += " AND (wr.record_date, wr.id) < (%s, %s)"
+        params.extend(after)
+    query = RECORDS_SELECT + where + " ORDER BY wr.record_date DESC, wr.id DESC LIMIT %s"
+    params.append(page_size + 1)
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        results = [WeightRecord._make(row) for row in cursor.fetchall()]
+        cursor.close()
+
+    next_key = None
+    if len(results) > page_size:
+        results = results[:page_size]
+        next_key = results[-1].page_key
+    return RecordsPage(results, next_key)
+
+@cached_query(ttl=config.CACHE_TTL_RECORDS, tags=lambda user_id, *args, **kwargs: (user_records_tag(user_id),))
+@instrumented
+def get_weight_history(user_id, max_points=None):
+    """Registros do funcionário em ordem de data, reduzidos por LTTB a ``max_points``."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT record_date, weight FROM weight_records
+            WHERE user_id = %s ORDER BY record_date, id
+        """, (user_id,))
+        results = [WeightPoint._make(row) for row in cursor.fetchall()]
+        cursor.close()
+    if max_points:
+        results = downsample_points(results, max_points)
+    return results
+
+SERIES_RESOLUTIONS = ("day", "week", "month")
+
+@cached_query(ttl=config.CACHE_TTL_REPORTS, tags=records_cache_tags)
+@instrumented
+def get_weight_series(user_id=None, start_date=None, resolution="day", by_type=False,
+                      max_points=config.CHART_MAX_POINTS):
+    """Totais por dia, semana ou mês a partir de weight_daily_rollup.
+
+    Com ``by_type`` há uma série por tipo de trabalho. Cada série passa de
+    no máximo ``max_points`` pontos (LTTB), qualquer que seja o período.
+    """
+    if resolution not in SERIES_RESOLUTIONS:
+        raise ValueError(f"Resolução inválida: {resolution!r}")
+    type_column = "work_type" if by_type else "NULL::varchar"
+    query = f"""
+        SELECT date_trunc(%s, record_date)::date AS bucket, SUM(total_weight)::float,
+               SUM(record_count)::int, {type_column}
+        FROM weight_daily_rollup WHERE 1=1
+    """
+    params = [resolution]
+    if user_id:
+        query += " AND user_id = %s"
+        params.append(user_id)
+    if start_date:
+        # Começa no início do período para o primeiro ponto não ficar parcial
+        query += " AND record_date >= date_trunc(%s, %s::date)::date"
+        params.extend([resolution, start_date])
+    query += " GROUP BY 1, 4 ORDER BY 4, 1"
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        results = [SeriesPoint._make(row) for row in cursor.fetchall()]
+        cursor.close()
+
+    series = {}
+    for point in results:
+        series.setdefault(point.work_type, []).append(point)
+    return [point for points in series.values() for point in downsample_points(points, max_points)]
+
+@cached_query(ttl=config.CACHE_TTL_REPORTS, tags=("records",))
+@instrumented
+def get_report_rollups(start_date):
+    """Totais por tipo e top 10 funcionários a partir de weight_daily_rollup."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+
+        # Por tipo
+        cursor.execute("""
+            SELECT work_type, SUM(total_weight)::float
+            FROM weight_daily_rollup
+            WHERE record_date >= %s
+            GROUP BY work_type
+        """, (start_date,))
+        by_type = cursor.fetchall()
+
+        # Top funcionários
+        cursor.execute("""
+            SELECT u.first_name || ' ' || u.last_name, SUM(r.total_weight)::float AS total
+            FROM weight_daily_rollup r
+            JOIN users u ON r.user_id = u.id
+            WHERE r.record_date >= %s
+            GROUP BY u.id, u.first_name, u.last_name
+            ORDER BY total DESC
+            LIMIT 10
+        """, (start_date,))
+        top_users = cursor.fetchall()
+
+        cursor.close()
+
+    return ReportRollups(by_type, top_users)
+
+@cached_query(ttl=config.CACHE_TTL_USERS, tags=("users",))
+@instrumented
+def get_all_users():
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, cpf, first_name, last_name, email, is_admin, work_type, is_active
+            FROM users ORDER BY first_name, last_name
+        """)
+        results = [UserSummary._make(row) for row in cursor.fetchall()]
+        cursor.close()
+    return results
+
+@cached_query(ttl=config.CACHE_TTL_STATS, tags=("records", "users"))
+@instrumented
+def get_daily_stats():
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+
+        # Ativos hoje, peso de hoje, do mês, média semanal e total de usuários
+        cursor.execute("""
+            SELECT
+                COUNT(DISTINCT user_id) FILTER (WHERE record_date = CURRENT_DATE),
+                COALESCE(SUM(weight) FILTER (WHERE record_date = CURRENT_DATE), 0),
+                COALESCE(SUM(weight) FILTER (
+                    WHERE record_date >= DATE_TRUNC('month', CURRENT_DATE)::date
+                      AND record_date < (DATE_TRUNC('month', CURRENT_DATE) + INTERVAL '1 month')::date
+                ), 0),
+                COALESCE(AVG(weight) FILTER (WHERE record_date >= CURRENT_DATE - 7), 0),
+                (SELECT COUNT(*) FROM users)
+            FROM weight_records
+            WHERE record_date >= LEAST(DATE_TRUNC('month', CURRENT_DATE)::date, CURRENT_DATE - 7)
+        """)
+        active_users, today_weight, monthly_weight, weekly_average, total_users = cursor.fetchone()
+        cursor.close()
+
+    return DailyStats(active_users, float(today_weight), float(monthly_weight),
+                      float(weekly_average), total_users)
+
+@instrumented
+def get_live_baseline():
+    """Somas dos indicadores do dashboard admin e o maior id do mesmo snapshot.
+
+    Ponto de partida de ``sgpgf.live``, que soma a elas os registros de id
+    maior que ``last_id`` conforme chegam as notificações.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT
+                CURRENT_DATE,
+                (SELECT COALESCE(MAX(id), 0) FROM weight_records),
+                COALESCE(ARRAY_AGG(DISTINCT user_id) FILTER (WHERE record_date = CURRENT_DATE), '{}'),
+                COALESCE(SUM(weight) FILTER (WHERE record_date = CURRENT_DATE), 0),
+                COALESCE(SUM(weight) FILTER (
+                    WHERE record_date >= DATE_TRUNC('month', CURRENT_DATE)::date
+                      AND record_date < (DATE_TRUNC('month', CURRENT_DATE) + INTERVAL '1 month')::date
+                ), 0),
+                COALESCE(SUM(weight) FILTER (WHERE record_date >= CURRENT_DATE - 7), 0),
+                COUNT(*) FILTER (WHERE record_date >= CURRENT_DATE - 7),
+                (SELECT COUNT(*) FROM users)
+            FROM weight_records
+            WHERE record_date >= LEAST(DATE_TRUNC('month', CURRENT_DATE)::date, CURRENT_DATE - 7)
+        """)
+        (day, last_id, active_user_ids, today_weight, monthly_weight,
+         week_weight, week_count, total_users) = cursor.fetchone()
+        cursor.close()
+
+    return LiveBaseline(day, last_id, list(active_user_ids), float(today_weight), float(monthly_weight),
+                        float(week_weight), week_count, total_users)
+
+LIVE_RECORDS_SELECT = """
+    SELECT wr.id, wr.weight, wr.work_type, wr.notes, wr.record_date,
+           u.first_name, u.last_name, u.cpf, wr.user_id
+    FROM weight_records wr
+    JOIN users u ON wr.user_id = u.id
+"""
+
+@instrumented
+def get_latest_records(limit, max_id):
+    """Os ``limit`` registros de maior id até ``max_id``, mais novos primeiro."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(LIVE_RECORDS_SELECT + " WHERE wr.id <= %s ORDER BY wr.id DESC LIMIT %s",
+                       (max_id, limit))
+        results = [WeightRecord._make(row[:8]) for row in cursor.fetchall()]
+        cursor.close()
+    return results
+
+@instrumented
+def get_records_by_id_ranges(id_ranges, limit):
+    """Registros cujo id cai em algum intervalo ``(menor, maior)``, em ordem de id.
+
+    ``maior`` ``None`` deixa o intervalo aberto. Retorna pares
+    ``(WeightRecord, user_id)``.
+    """
+    conditions = []
+    params = []
+    for low, high in id_ranges:
+        if high is None:
+            conditions.append("wr.id >= %s")
+            params.append(low)
+        else:
+            conditions.append("wr.id BETWEEN %s AND %s")
+            params.extend((low, high))
+    if not conditions:
+        return []
+    params.append(limit)
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(LIVE_RECORDS_SELECT + " WHERE " + " OR ".join(conditions)
+                       + " ORDER BY wr.id LIMIT %s", params)
+        results = [(WeightRecord._make(row[:8]), row[8]) for row in cursor.fetchall()]
+        cursor.close()
+    return results
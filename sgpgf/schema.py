@@ -0,0 +1,312 @@
+"""Esquema do banco: migrações versionadas aplicadas uma única vez, em ordem."""
+import logging
+import threading
+import time
+
+from sgpgf import config
+from sgpgf.db import get_db_connection
+from sgpgf.errors import DataAccessError
+from sgpgf.partitions import ensure_partitions
+
+logger = logging.getLogger("sgpgf.schema")
+
+# Migrações de esquema versionadas: cada versão é aplicada uma única vez,
+# em ordem, e registrada em schema_migrations. Novas alterações de esquema
+# devem entrar como uma nova versão no fim da lista.
+SCHEMA_MIGRATIONS = [
+    (1, "Tabelas users e weight_records", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            cpf VARCHAR(11) UNIQUE NOT NULL,
+            password VARCHAR(255),
+            first_name VARCHAR(100) NOT NULL,
+            last_name VARCHAR(100) NOT NULL,
+            email VARCHAR(255),
+            profile_image_url TEXT,
+            is_admin BOOLEAN DEFAULT FALSE,
+            work_type VARCHAR(50) NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS weight_records (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            weight DECIMAL(10,2) NOT NULL,
+            work_type VARCHAR(50) NOT NULL,
+            notes TEXT,
+            record_date DATE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (2, "Índices para filtros por usuário, data e tipo", [
+        "CREATE INDEX IF NOT EXISTS idx_weight_records_user_date ON weight_records (user_id, record_date)",
+        "CREATE INDEX IF NOT EXISTS idx_weight_records_date_type ON weight_records (record_date, work_type)",
+    ]),
+    (3, "Agregado diário por (data, usuário, tipo) para relatórios", [
+        """
+        CREATE TABLE IF NOT EXISTS weight_daily_rollup (
+            record_date DATE NOT NULL,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            work_type VARCHAR(50) NOT NULL,
+            total_weight DECIMAL(14,2) NOT NULL DEFAULT 0,
+            record_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (record_date, user_id, work_type)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_weight_daily_rollup_user_date ON weight_daily_rollup (user_id, record_date)",
+        """
+        INSERT INTO weight_daily_rollup (record_date, user_id, work_type, total_weight, record_count)
+        SELECT record_date, user_id, work_type, SUM(weight), COUNT(*)
+        FROM weight_records
+        WHERE user_id IS NOT NULL
+        GROUP BY record_date, user_id, work_type
+        ON CONFLICT (record_date, user_id, work_type) DO NOTHING
+        """,
+    ]),
+    (4, "Chave de idempotência para importações em lote", [
+        "ALTER TABLE weight_records ADD COLUMN IF NOT EXISTS import_key VARCHAR(64)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_weight_records_import_key ON weight_records (import_key)",
+    ]),
+    (5, "Resumo por funcionário para o dashboard pessoal", [
+        """
+        CREATE TABLE IF NOT EXISTS user_weight_summary (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id),
+            as_of DATE NOT NULL,
+            today_weight DECIMAL(14,2) NOT NULL DEFAULT 0,
+            month_weight DECIMAL(14,2) NOT NULL DEFAULT 0,
+            week_weight DECIMAL(14,2) NOT NULL DEFAULT 0,
+            week_count INTEGER NOT NULL DEFAULT 0,
+            recent_days JSONB NOT NULL DEFAULT '{}',
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        WITH days AS (
+            SELECT user_id, record_date, SUM(total_weight) AS weight, SUM(record_count) AS records
+            FROM weight_daily_rollup
+            WHERE record_date >= CURRENT_DATE - 61
+            GROUP BY user_id, record_date
+        )
+        INSERT INTO user_weight_summary (user_id, as_of, today_weight, month_weight, week_weight,
+                                         week_count, recent_days)
+        SELECT d.user_id, CURRENT_DATE,
+               COALESCE(SUM(d.weight) FILTER (WHERE d.record_date = CURRENT_DATE), 0),
+               COALESCE(SUM(d.weight) FILTER (
+                   WHERE d.record_date >= DATE_TRUNC('month', CURRENT_DATE)::date
+                     AND d.record_date < (DATE_TRUNC('month', CURRENT_DATE) + INTERVAL '1 month')::date
+               ), 0),
+               COALESCE(SUM(d.weight) FILTER (WHERE d.record_date >= CURRENT_DATE - 7), 0),
+               COALESCE(SUM(d.records) FILTER (WHERE d.record_date >= CURRENT_DATE - 7), 0),
+               jsonb_object_agg(to_char(d.record_date, 'YYYY-MM-DD'),
+                                jsonb_build_array(d.weight, d.records))
+        FROM days d
+        GROUP BY d.user_id
+        ON CONFLICT (user_id) DO NOTHING
+        """,
+    ]),
+    (6, "Particionamento mensal de weight_records", [
+        # A tabela atual é renomeada, os dados são copiados para a nova tabela
+        # particionada por mês e a antiga é removida, tudo em uma transação.
+        # A chave primária e a chave de idempotência passam a incluir
+        # record_date, exigência do particionamento.
+        #
+        # Bancos criados pelo schema Drizzle (shared/schema.ts) têm id como
+        # coluna identity, cuja sequência não pode mudar de dono nem
+        # sobreviver à tabela: ela é trocada por uma sequência comum, como a
+        # do SERIAL, que continua a partir do último id gerado.
+        """
+        DO $$
+        DECLARE
+            identity_sequence TEXT;
+            last_id BIGINT;
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_attribute
+                       WHERE attrelid = 'weight_records'::regclass AND attname = 'id'
+                         AND attidentity <> '') THEN
+                identity_sequence := pg_get_serial_sequence('weight_records', 'id');
+                EXECUTE format('SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM %s',
+                               identity_sequence) INTO last_id;
+                SELECT GREATEST(last_id, COALESCE(MAX(id), 0)) INTO last_id FROM weight_records;
+                ALTER TABLE weight_records ALTER COLUMN id DROP IDENTITY;
+                CREATE SEQUENCE weight_records_id_seq AS INTEGER OWNED BY weight_records.id;
+                PERFORM setval('weight_records_id_seq', GREATEST(last_id, 1), last_id > 0);
+                ALTER TABLE weight_records ALTER COLUMN id SET DEFAULT nextval('weight_records_id_seq');
+            END IF;
+        END
+        $$
+        """,
+        "ALTER TABLE weight_records RENAME TO weight_records_unpartitioned",
+        "ALTER TABLE weight_records_unpartitioned RENAME CONSTRAINT weight_records_pkey TO weight_records_unpartitioned_pkey",
+        "DROP INDEX IF EXISTS idx_weight_records_user_date",
+        "DROP INDEX IF EXISTS idx_weight_records_date_type",
+        "DROP INDEX IF EXISTS idx_weight_records_import_key",
+        """
+        CREATE TABLE weight_records (
+            id INTEGER NOT NULL DEFAULT nextval('weight_records_id_seq'),
+            user_id INTEGER REFERENCES users(id),
+            weight DECIMAL(10,2) NOT NULL,
+            work_type VARCHAR(50) NOT NULL,
+            notes TEXT,
+            record_date DATE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            import_key VARCHAR(64),
+            PRIMARY KEY (id, record_date)
+        ) PARTITION BY RANGE (record_date)
+        """,
+        "CREATE TABLE weight_records_default PARTITION OF weight_records DEFAULT",
+        # Cria as partições mensais que faltam entre dois meses. Linhas do
+        # intervalo que caíram na partição padrão são movidas para a nova.
+        """
+        CREATE OR REPLACE FUNCTION ensure_weight_records_partitions(first_month DATE, last_month DATE)
+        RETURNS INTEGER LANGUAGE plpgsql AS $$
+        DECLARE
+            month DATE := date_trunc('month', first_month)::date;
+            next_month DATE;
+            partition_name TEXT;
+            created INTEGER := 0;
+        BEGIN
+            WHILE month <= last_month LOOP
+                next_month := (month + INTERVAL '1 month')::date;
+                partition_name := 'weight_records_p' || to_char(month, 'YYYYMM');
+                IF to_regclass(partition_name) IS NULL THEN
+                    EXECUTE 'CREATE TEMP TABLE IF NOT EXISTS weight_records_moving '
+                            '(LIKE weight_records) ON COMMIT DROP';
+                    EXECUTE 'WITH moved AS (DELETE FROM weight_records_default '
+                            'WHERE record_date >= $1 AND record_date < $2 RETURNING *) '
+                            'INSERT INTO weight_records_moving SELECT * FROM moved'
+                        USING month, next_month;
+                    EXECUTE format('CREATE TABLE %I PARTITION OF weight_records FOR VALUES FROM (%L) TO (%L)',
+                                   partition_name, month, next_month);
+                    EXECUTE 'INSERT INTO weight_records SELECT * FROM weight_records_moving';
+                    EXECUTE 'TRUNCATE weight_records_moving';
+                    created := created + 1;
+                END IF;
+                month := next_month;
+            END LOOP;
+            RETURN created;
+        END
+        $$
+        """,
+        f"""
+        SELECT ensure_weight_records_partitions(
+            COALESCE((SELECT MIN(record_date) FROM weight_records_unpartitioned), CURRENT_DATE),
+            (date_trunc('month', CURRENT_DATE) + INTERVAL '{config.PARTITION_MONTHS_AHEAD:d} months')::date
+        )
+        """,
+        """
+        INSERT INTO weight_records (id, user_id, weight, work_type, notes, record_date, created_at, import_key)
+        SELECT id, user_id, weight, work_type, notes, record_date, created_at, import_key
+        FROM weight_records_unpartitioned
+        """,
+        "ALTER SEQUENCE weight_records_id_seq OWNED BY NONE",
+        "DROP TABLE weight_records_unpartitioned",
+        "ALTER SEQUENCE weight_records_id_seq OWNED BY weight_records.id",
+        "CREATE INDEX idx_weight_records_user_date ON weight_records (user_id, record_date)",
+        "CREATE INDEX idx_weight_records_date_type ON weight_records (record_date, work_type)",
+        "CREATE UNIQUE INDEX idx_weight_records_import_key ON weight_records (import_key, record_date)",
+    ]),
+    (7, "Resumos de produtividade por período (sgpgf.analytics)", [
+        """
+        ALTER TABLE weight_daily_rollup
+        ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_weight_daily_rollup_updated_at ON weight_daily_rollup (updated_at)",
+        """
+        CREATE TABLE IF NOT EXISTS productivity_summary (
+            period_kind VARCHAR(5) NOT NULL,
+            period_start DATE NOT NULL,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            work_type VARCHAR(50) NOT NULL,
+            total_weight DECIMAL(14,2) NOT NULL,
+            record_count INTEGER NOT NULL,
+            percentile_rank REAL NOT NULL,
+            trend REAL,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (period_kind, period_start, user_id, work_type)
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_productivity_summary_user
+        ON productivity_summary (user_id, period_kind, period_start)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS analytics_runs (
+            job VARCHAR(50) PRIMARY KEY,
+            processed_until TIMESTAMP NOT NULL,
+            finished_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+]
+
+# Chave do advisory lock que serializa migrações entre processos
+SCHEMA_MIGRATIONS_LOCK = 7243001
+
+def apply_schema_migrations(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_lock(%s)", (SCHEMA_MIGRATIONS_LOCK,))
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+
+        for version, description, statements in SCHEMA_MIGRATIONS:
+            if version in applied:
+                continue
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+            conn.commit()
+    finally:
+        conn.rollback()
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (SCHEMA_MIGRATIONS_LOCK,))
+        conn.commit()
+        cursor.close()
+
+schema_ready = False
+# (momento, erro) da última falha; evita repetir uma migração pesada a cada
+# recarga de página enquanto o problema persiste
+schema_failure = None
+schema_lock = threading.Lock()
+
+def ensure_schema():
+    """Aplica as migrações pendentes e cria as partições dos próximos meses, uma vez por processo.
+
+    Depois de uma falha, chamadas nos ``SCHEMA_RETRY_SECONDS`` seguintes
+    levantam o mesmo erro sem tocar no banco; passado o intervalo, a próxima
+    chamada tenta novamente.
+    """
+    global schema_ready, schema_failure
+    if schema_ready:
+        return
+    with schema_lock:
+        if schema_ready:
+            return
+        if schema_failure and time.monotonic() - schema_failure[0] < config.SCHEMA_RETRY_SECONDS:
+            raise DataAccessError(f"Migração falhou; nova tentativa em até "
+                                  f"{config.SCHEMA_RETRY_SECONDS:.0f}s: {schema_failure[1]}")
+        try:
+            with get_db_connection() as conn:
+                apply_schema_migrations(conn)
+                ensure_partitions(conn)
+        except Exception as e:
+            schema_failure = (time.monotonic(), e)
+            logger.error("Falha ao preparar o esquema do banco: %s", e)
+            raise
+        schema_ready = True
+        schema_failure = None
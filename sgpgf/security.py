@@ -0,0 +1,71 @@
+"""Hash de senhas e tokens de sessão.
+
+bcrypt roda em um pool limitado de threads (a biblioteca libera o GIL): uma
+rajada de logins não disputa todos os núcleos com as demais sessões.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from sgpgf import config
+
+# Sem SESSION_SECRET, gera uma chave por processo
+session_secret = os.getenv("SESSION_SECRET") or secrets.token_hex(32)
+
+password_executor = None
+password_executor_lock = threading.Lock()
+
+def get_password_executor():
+    global password_executor
+    if password_executor is None:
+        with password_executor_lock:
+            if password_executor is None:
+                password_executor = ThreadPoolExecutor(max_workers=config.PASSWORD_HASH_WORKERS,
+                                                       thread_name_prefix="bcrypt")
+    return password_executor
+
+def bcrypt_hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def bcrypt_check(password, hashed):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+def hash_password(password):
+    return get_password_executor().submit(bcrypt_hash, password, config.BCRYPT_ROUNDS).result()
+
+def verify_password(password, hashed):
+    if not hashed:
+        return False
+    return get_password_executor().submit(bcrypt_check, password, hashed).result()
+
+def password_needs_rehash(hashed):
+    # Formato bcrypt: $2b$<custo>$<salt+hash>
+    try:
+        return int(hashed.split('$')[2]) != config.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def sign_session(payload):
+    return hmac.new(session_secret.encode('utf-8'), payload.encode('utf-8'), hashlib.sha256).hexdigest()
+
+def issue_session_token(user_id, login_type):
+    expires_at = int(time.time() + config.SESSION_TTL_HOURS * 3600)
+    payload = f"{user_id}:{login_type}:{expires_at}"
+    return f"{payload}:{sign_session(payload)}"
+
+def session_token_valid(token, user_id, login_type):
+    """Valida o token da sessão com um HMAC, sem repetir o bcrypt a cada execução."""
+    try:
+        token_user_id, token_type, expires_at, signature = token.split(':')
+        payload = f"{token_user_id}:{token_type}:{expires_at}"
+        return (hmac.compare_digest(signature, sign_session(payload))
+                and token_user_id == str(user_id) and token_type == login_type
+                and int(expires_at) > time.time())
+    except (AttributeError, ValueError):
+        return False
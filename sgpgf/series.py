@@ -0,0 +1,46 @@
+"""Redução de séries temporais antes de montar os gráficos.
+
+Limita a quantidade de pontos enviados ao navegador sem achatar picos e
+vales: Largest-Triangle-Three-Buckets escolhe, em cada faixa da série, o
+ponto que mais altera o formato da linha.
+"""
+import numpy as np
+
+def lttb_indices(x, y, threshold):
+    """Índices (em ordem) dos ``threshold`` pontos mantidos pelo LTTB.
+
+    O primeiro e o último ponto são sempre mantidos; os demais são
+    divididos em ``threshold - 2`` faixas e de cada uma fica o ponto que
+    forma o maior triângulo com o ponto escolhido na faixa anterior e a
+    média da faixa seguinte.
+    """
+    n = len(x)
+    if threshold < 3 or n <= threshold:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_x = x[end:edges[bucket + 2]].mean()
+            next_y = y[end:edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(areas.argmax())
+        selected[bucket + 1] = previous
+    return selected
+
+def downsample_points(points, max_points):
+    """Reduz uma lista de tuplas ``(data, valor, ...)`` ordenada por data a no máximo ``max_points``."""
+    if len(points) <= max_points:
+        return list(points)
+    x = np.fromiter((point[0].toordinal() for point in points), dtype=float, count=len(points))
+    y = np.fromiter((float(point[1]) for point in points), dtype=float, count=len(points))
+    return [points[index] for index in lttb_indices(x, y, max_points)]
@@ -0,0 +1,196 @@
+"""Fila local de gravação (write-behind) dos registros de peso.
+
+Com ``WRITE_BEHIND`` ativo, cada registro é gravado primeiro em um arquivo
+SQLite em modo WAL e confirmado ao funcionário na hora; uma thread envia a
+fila ao PostgreSQL em lotes, com espera exponencial enquanto o banco falha.
+Cada registro leva uma ``import_key`` própria, então reenviar um lote que já
+chegou ao banco (queda entre o commit e a baixa na fila, ou dois processos
+com o mesmo arquivo) não duplica registros.
+"""
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from datetime import date, datetime
+
+import psycopg2
+
+from sgpgf import config
+from sgpgf.cache import invalidate_records
+from sgpgf.db import get_db_connection
+from sgpgf.errors import DataAccessError
+from sgpgf.models import QueuedRecord
+from sgpgf.repository import insert_weight_records
+
+logger = logging.getLogger("sgpgf.writebehind")
+
+PENDING = "pending"
+SYNCED = "synced"
+FAILED = "failed"
+
+QUEUE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS queued_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        import_key TEXT NOT NULL UNIQUE,
+        user_id INTEGER NOT NULL,
+        weight REAL NOT NULL,
+        work_type TEXT NOT NULL,
+        notes TEXT,
+        record_date TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        created_at REAL NOT NULL,
+        synced_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_queued_records_status ON queued_records (status, id);
+    CREATE INDEX IF NOT EXISTS idx_queued_records_user ON queued_records (user_id, id);
+"""
+
+def is_permanent_error(error):
+    # Dado rejeitado pelo banco (usuário removido, valor fora do tipo): repetir não adianta
+    return isinstance(error.__cause__, (psycopg2.DataError, psycopg2.IntegrityError))
+
+class WriteBehindQueue:
+    """Fila durável de registros ainda não gravados no PostgreSQL."""
+
+    def __init__(self, path):
+        self._path = path
+        self._wakeup = threading.Event()
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(QUEUE_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self._path, timeout=30)
+        # Cada enfileiramento confirmado já está no disco
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    def enqueue(self, user_id, weight, work_type, notes, record_date):
+        import_key = uuid.uuid4().hex
+        with closing(self._connect()) as conn, conn:
+            conn.execute("""
+                INSERT INTO queued_records (import_key, user_id, weight, work_type, notes,
+                                            record_date, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (import_key, user_id, float(weight), work_type, notes or None,
+                  record_date.isoformat(), time.time()))
+        self._wakeup.set()
+        return import_key
+
+    def pending_batch(self, limit):
+        with closing(self._connect()) as conn:
+            return conn.execute("""
+                SELECT id, user_id, weight, work_type, notes, record_date, import_key
+                FROM queued_records WHERE status = ? ORDER BY id LIMIT ?
+            """, (PENDING, limit)).fetchall()
+
+    def mark(self, queue_ids, status, error=None):
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("""
+                UPDATE queued_records
+                SET status = ?, attempts = attempts + 1, last_error = ?,
+                    synced_at = CASE WHEN ? = 'synced' THEN ? END
+                WHERE id = ?
+            """, [(status, error, status, now, queue_id) for queue_id in queue_ids])
+
+    def recent(self, user_id, limit=20):
+        with closing(self._connect()) as conn:
+            rows = conn.execute("""
+                SELECT import_key, weight, work_type, notes, record_date, status, attempts,
+                       last_error, created_at
+                FROM queued_records WHERE user_id = ? ORDER BY id DESC LIMIT ?
+            """, (user_id, limit)).fetchall()
+        return [QueuedRecord(key, weight, work_type, notes, date.fromisoformat(record_date),
+                             status, attempts, last_error, datetime.fromtimestamp(created_at))
+                for key, weight, work_type, notes, record_date, status, attempts, last_error, created_at
+                in rows]
+
+    def counts(self):
+        with closing(self._connect()) as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM queued_records GROUP BY status"))
+        return {status: counts.get(status, 0) for status in (PENDING, SYNCED, FAILED)}
+
+    def prune(self, max_age_hours=config.WRITE_BEHIND_RETENTION_HOURS):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM queued_records WHERE status = ? AND synced_at < ?",
+                         (SYNCED, time.time() - max_age_hours * 3600))
+
+    def send(self, batch):
+        values = [(user_id, weight, work_type, notes, date.fromisoformat(record_date), import_key)
+                  for _, user_id, weight, work_type, notes, record_date, import_key in batch]
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            inserted = insert_weight_records(cursor, values)
+            conn.commit()
+            cursor.close()
+        self.mark([row[0] for row in batch], SYNCED)
+        if inserted:
+            invalidate_records(*{user_id for _, user_id in inserted})
+
+    def flush(self, batch_size=config.WRITE_BEHIND_BATCH):
+        """Envia um lote pendente; retorna quantos registros saíram da fila.
+
+        Falhas transitórias (banco fora, pool esgotado) são levantadas e o
+        lote continua pendente. Um registro rejeitado pelo banco não trava a
+        fila: o lote é reenviado linha a linha e só as rejeitadas ficam como
+        ``failed``.
+        """
+        batch = self.pending_batch(batch_size)
+        if not batch:
+            return 0
+        try:
+            self.send(batch)
+        except DataAccessError as e:
+            if not is_permanent_error(e):
+                self.mark([row[0] for row in batch], PENDING, str(e))
+                raise
+            for row in batch:
+                try:
+                    self.send([row])
+                except DataAccessError as row_error:
+                    if not is_permanent_error(row_error):
+                        raise
+                    logger.error("Registro %s rejeitado pelo banco: %s", row[6], row_error)
+                    self.mark([row[0]], FAILED, str(row_error))
+        return len(batch)
+
+    def run(self):
+        delay = config.WRITE_BEHIND_INTERVAL
+        while True:
+            try:
+                while self.flush():
+                    pass
+                self.prune()
+                delay = config.WRITE_BEHIND_INTERVAL
+                # Novos registros acordam a thread antes do intervalo
+                self._wakeup.wait(delay)
+                self._wakeup.clear()
+            except Exception as e:
+                delay = min(delay * 2, config.WRITE_BEHIND_MAX_BACKOFF)
+                logger.warning("Falha ao enviar a fila de gravação (nova tentativa em %.0fs): %s",
+                               delay, e)
+                time.sleep(delay)
+
+write_behind_queue = None
+write_behind_lock = threading.Lock()
+
+def start_write_behind(path=None):
+    """Abre a fila do processo e inicia a thread de envio.
+
+    Sem ``WRITE_BEHIND`` (e sem ``path``) não faz nada; chamadas repetidas
+    reutilizam a fila já aberta. Registros deixados por uma execução
+    anterior são enviados assim que a thread inicia.
+    """
+    global write_behind_queue
+    if not (path or config.WRITE_BEHIND):
+        return None
+    with write_behind_lock:
+        if write_behind_queue is None:
+            write_behind_queue = WriteBehindQueue(path or config.WRITE_BEHIND_PATH)
+            threading.Thread(target=write_behind_queue.run, name="write-behind", daemon=True).start()
+        return write_behind_queue
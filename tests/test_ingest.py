@@ -0,0 +1,61 @@
+import pytest
+
+# sgpgf.ingest importa a camada de banco inteira
+pytest.importorskip("psycopg2")
+pytest.importorskip("bcrypt")
+pytest.importorskip("numpy")
+
+from sgpgf.ingest import IMPORT_KEY_MAX_LENGTH, import_first_line, validate_import_rows
+
+def make_row(**overrides):
+    row = {"cpf": "123.456.789-01", "weight": "12,5", "work_type": "filetagem",
+           "record_date": "05/03/2024", "notes": ""}
+    row.update(overrides)
+    return row
+
+def test_first_line_by_format():
+    assert import_first_line("lote.csv") == 2
+    assert import_first_line("LOTE.JSON") == 1
+
+def test_errors_cite_file_lines():
+    rows = [make_row(), make_row(cpf="123"), make_row(weight="abc")]
+
+    valid, errors = validate_import_rows(rows)
+    assert [row.line for row in valid] == [2]
+    assert [line for line, _ in errors] == [3, 4]
+
+    valid, errors = validate_import_rows(rows, first_line=1)
+    assert [row.line for row in valid] == [1]
+    assert [line for line, _ in errors] == [2, 3]
+
+def test_row_is_normalized():
+    (row,), errors = validate_import_rows([make_row(notes="  turno B ")])
+    assert errors == []
+    assert row.cpf == "12345678901"
+    assert row.weight == 12.5
+    assert row.work_type == "Filetagem"
+    assert row.record_date.isoformat() == "2024-03-05"
+    assert row.notes == "turno B"
+
+def test_long_idempotency_key_is_rejected():
+    rows = [make_row(idempotency_key="a" * IMPORT_KEY_MAX_LENGTH),
+            make_row(idempotency_key="a" * (IMPORT_KEY_MAX_LENGTH + 1))]
+
+    valid, errors = validate_import_rows(rows)
+    assert [row.import_key for row in valid] == ["a" * IMPORT_KEY_MAX_LENGTH]
+    assert [line for line, _ in errors] == [3]
+    assert "idempotency_key" in errors[0][1]
+
+def test_identical_rows_get_distinct_stable_keys():
+    rows = [make_row(), make_row(), make_row(weight="13")]
+
+    valid, errors = validate_import_rows(rows)
+    keys = [row.import_key for row in valid]
+    assert errors == []
+    assert len(set(keys)) == 3
+    assert all(len(key) <= IMPORT_KEY_MAX_LENGTH for key in keys)
+
+    # Reimportar o arquivo, ou um que o estende, gera as mesmas chaves
+    extended, _ = validate_import_rows(rows + [make_row()])
+    assert [row.import_key for row in extended[:3]] == keys
+    assert extended[3].import_key not in keys
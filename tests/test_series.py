@@ -0,0 +1,29 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from sgpgf.series import lttb_indices
+
+@pytest.mark.parametrize("n, threshold", [(10, 3), (100, 7), (1000, 50), (1001, 1000)])
+def test_lttb_keeps_endpoints_in_order(n, threshold):
+    x = np.arange(n, dtype=float)
+    y = np.sin(x / 7) * 100 + np.cos(x / 3) * 10
+
+    indices = lttb_indices(x, y, threshold)
+    assert len(indices) == threshold
+    assert indices[0] == 0
+    assert indices[-1] == n - 1
+    assert np.all(np.diff(indices) > 0)
+
+def test_lttb_keeps_peak():
+    x = np.arange(500, dtype=float)
+    y = np.zeros(500)
+    y[250] = 1000.0
+
+    assert 250 in lttb_indices(x, y, 20)
+
+@pytest.mark.parametrize("n, threshold", [(5, 10), (10, 10), (10, 2)])
+def test_lttb_returns_all_points_when_not_reducing(n, threshold):
+    x = np.arange(n, dtype=float)
+
+    assert list(lttb_indices(x, x, threshold)) == list(range(n))